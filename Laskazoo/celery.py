@@ -19,6 +19,14 @@ app.conf.beat_schedule = {
         'task': 'apps.orders.tasks.export_orders_task',
         'schedule': crontab(minute='*/15'),  # Кожні 15 хвилин
     },
+    'release-expired-reservations-every-5-minutes': {
+        'task': 'apps.orders.tasks.release_expired_reservations_task',
+        'schedule': crontab(minute='*/5'),
+    },
+    'warm-facet-index-every-5-minutes': {
+        'task': 'apps.products.tasks.warm_facet_index_task',
+        'schedule': crontab(minute='*/5'),
+    },
 }
 
 # Для тестування можна використовувати:
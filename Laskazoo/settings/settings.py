@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'Laskazoo',
     'apps.products',
     'apps.users',
@@ -138,6 +139,37 @@ DATABASES = {
 }
 
 
+# Кеш: Redis — спільний для gunicorn-воркерів, Celery і manage.py-команд.
+# На ньому тримаються версія каталогу (bump_catalog_version() з sync_ts_direct
+# має дійти до всіх воркерів), бакети throttle, обране та підсумки кошика,
+# тож кеш у пам'яті процесу для них некоректний. Redis і так потрібен Celery.
+# CACHE_URL=locmem:// — лише для локальної розробки в одному процесі без Redis.
+CACHE_URL = os.getenv('CACHE_URL', 'redis://localhost:6379/1')
+if CACHE_URL.startswith('locmem://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'laskazoo',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'laskazoo',
+        },
+    }
+
+
+# Throttle (Laskazoo/throttle.py): скільки реверс-проксі (nginx) перед gunicorn
+# дописують X-Forwarded-For — IP клієнта береться з позиції найближчого з них.
+# THROTTLE_REAL_IP_HEADER (напр. HTTP_X_REAL_IP) — якщо проксі передає адресу
+# окремим заголовком.
+THROTTLE_TRUSTED_PROXIES = int(os.getenv('THROTTLE_TRUSTED_PROXIES', '1'))
+THROTTLE_REAL_IP_HEADER = os.getenv('THROTTLE_REAL_IP_HEADER', '')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
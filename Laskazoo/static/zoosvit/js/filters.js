@@ -1,9 +1,11 @@
 // static/zoosvit/js/filters.js
 window.applyFilters = function(){
   const url = new URL(window.location.href);
-  url.searchParams.delete('brand');
-  document.querySelectorAll('input[name="brand"]:checked')
-    .forEach(cb => url.searchParams.append('brand', cb.value));
+  ['brand', 'size', 'weight', 'color'].forEach(name => {
+    url.searchParams.delete(name);
+    document.querySelectorAll(`input[name="${name}"]:checked`)
+      .forEach(cb => url.searchParams.append(name, cb.value));
+  });
   const min = document.querySelector('input[name="price_min"]')?.value || '';
   const max = document.querySelector('input[name="price_max"]')?.value || '';
   const inStock = document.querySelector('input[name="in_stock"]')?.checked || false;
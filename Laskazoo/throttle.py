@@ -0,0 +1,127 @@
+"""
+Обмеження частоти та захист від подвійних запитів для AJAX-ендпоінтів.
+
+Стан живе в кеші (Redis, спільний для всіх воркерів), а не в
+сесії — тож клік по «в кошик» не пише сесію лише заради захисту, і сесія
+не розростається ключем на кожен товар.
+
+@throttle(scope, rate=(N, секунд), dedup=секунд):
+- rate — N запитів за вказаний час (ковзне вікно з двох лічильників,
+  cache.add + cache.incr — атомарно між воркерами);
+- dedup — однаковий запит (той самий клієнт + шлях) у цьому вікні
+  вважається подвійним кліком;
+- заголовок X-Idempotency-Key: повтор із тим самим ключем отримує
+  збережену першу відповідь замість повторного виконання.
+
+Клієнт — користувач, сесія гостя або IP (нова сесія не створюється).
+IP береться з THROTTLE_REAL_IP_HEADER або з X-Forwarded-For на позиції,
+яку дописав найближчий із THROTTLE_TRUSTED_PROXIES довірених проксі —
+ліві частини заголовка клієнт може підробити.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+THROTTLE_MESSAGE = 'Дуже швидко! Почекайте'
+IDEMPOTENCY_HEADER = 'X-Idempotency-Key'
+IDEMPOTENCY_TIMEOUT = 60 * 10
+
+
+def client_ip(request):
+    header = getattr(settings, 'THROTTLE_REAL_IP_HEADER', '')
+    if header:
+        real_ip = request.META.get(header, '').strip()
+        if real_ip:
+            return real_ip
+    proxies = getattr(settings, 'THROTTLE_TRUSTED_PROXIES', 0)
+    if proxies:
+        hops = [h.strip() for h in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if h.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'u{user.pk}'
+    session_key = request.session.session_key if hasattr(request, 'session') else None
+    if session_key:
+        return f's{session_key}'
+    return 'ip' + client_ip(request)
+
+
+def take_token(key, capacity, per):
+    """
+    True, якщо запит вкладається в capacity за останні per секунд.
+    Лічильник поточного вікна збільшується атомарно (cache.incr), попереднє
+    вікно враховується пропорційно часу, що від нього лишився в ковзному.
+    """
+    now = time.time()
+    window = int(now // per)
+    current = f'{key}:{window}'
+    cache.add(current, 0, int(per * 2) + 1)
+    try:
+        count = cache.incr(current)
+    except ValueError:  # ключ витіснено між add та incr
+        cache.add(current, 1, int(per * 2) + 1)
+        count = 1
+    previous = cache.get(f'{key}:{window - 1}', 0)
+    weight = 1 - (now - window * per) / per
+    return count + previous * weight <= capacity
+
+
+def limited_response(request):
+    return JsonResponse({'ok': False, 'message': THROTTLE_MESSAGE}, status=429)
+
+
+def _store_response(key, response):
+    if response.streaming or response.status_code >= 500:
+        return
+    cache.set(key, (response.status_code, response.content,
+                    response.get('Content-Type'), response.get('Location')),
+              IDEMPOTENCY_TIMEOUT)
+
+
+def _replay_response(stored):
+    status, content, content_type, location = stored
+    response = HttpResponse(content, status=status, content_type=content_type)
+    if location:
+        response['Location'] = location
+    return response
+
+
+def throttle(scope, rate=None, dedup=None, on_limited=limited_response):
+    """
+    Декоратор в'юхи. rate=(capacity, per_seconds), dedup — секунди (ціле),
+    on_limited(request) — відповідь, коли запит відхилено.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            client = client_key(request)
+
+            idem = request.headers.get(IDEMPOTENCY_HEADER)
+            idem_key = f'throttle:idem:{scope}:{client}:{idem}' if idem else None
+            if idem_key:
+                stored = cache.get(idem_key)
+                if stored is not None:
+                    return _replay_response(stored)
+
+            if rate and not take_token(f'throttle:rate:{scope}:{client}', *rate):
+                return on_limited(request)
+
+            if dedup and not idem_key:
+                dedup_key = f'throttle:dedup:{scope}:{client}:{request.get_full_path()}'
+                if not cache.add(dedup_key, 1, dedup):
+                    return on_limited(request)
+
+            response = view(request, *args, **kwargs)
+            if idem_key:
+                _store_response(idem_key, response)
+            return response
+        return wrapped
+    return decorator
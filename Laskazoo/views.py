@@ -1,5 +1,5 @@
 from apps.products.models import PopularProduct, Product_Variant, PopularCategory
-from apps.favourites.models import Favourite
+from apps.favourites.services import favourite_state
 from django.shortcuts import render, redirect
 
 def stores_map(request):
@@ -95,18 +95,9 @@ def home(request):
     for pp in populars:
         pp.product.variants_for_card = by_pid.get(pp.product_id, [])
 
-    if request.user.is_authenticated:
-        fav_variant_ids = set(
-            Favourite.objects.filter(user=request.user, variant__isnull=False)
-            .values_list('variant_id', flat=True)
-        )
-        fav_product_ids = set(
-            Favourite.objects.filter(user=request.user, variant__isnull=True)
-            .values_list('product_id', flat=True)
-        )
-    else:
-        fav_variant_ids = set(map(int, request.session.get('fav_variant_ids', [])))
-        fav_product_ids = set(map(int, request.session.get('fav_product_ids', [])))
+    favs = favourite_state(request)
+    fav_variant_ids = favs.variant_ids
+    fav_product_ids = favs.product_ids
 
     return render(request, 'zoosvit/core/home.html', {
         'populars': populars,
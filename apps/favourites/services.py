@@ -0,0 +1,208 @@
+"""
+Стан обраного користувача: множини id товарів і варіантів.
+
+Для залогіненого — один запит до Favourite, результат лежить у кеші під
+ключем з версією користувача (FAVOURITES_CACHE_VERSION в ключі дозволяє
+скинути всі записи при зміні формату). Будь-яка зміна Favourite (toggle,
+адмінка, злиття при логіні) після коміту атомарно збільшує версію
+(cache.incr), а стан перечитується з БД — паралельні toggle не
+перезаписують один одного, як це було б при read-modify-write кешу.
+Для гостя — списки з сесії, як і раніше.
+
+В межах запиту стан запам'ятовується на request, тож context processor,
+в'юха та шаблон не ходять у БД повторно.
+
+merge_session_favourites при логіні переносить обране гостя в БД одним
+bulk_create — кількість запитів не залежить від розміру списку.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.products.models import Product, Product_Variant
+
+from .models import Favourite
+
+FAVOURITES_CACHE_VERSION = 1
+FAVOURITES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class FavouriteState:
+
+    def __init__(self, variant_ids=(), product_ids=()):
+        self.variant_ids = frozenset(variant_ids)
+        self.product_ids = frozenset(product_ids)
+
+    @property
+    def count(self):
+        return len(self.variant_ids) + len(self.product_ids)
+
+    def has_variant(self, variant_id):
+        return variant_id in self.variant_ids
+
+    def has_product(self, product_id):
+        return product_id in self.product_ids
+
+    def dump(self):
+        return (sorted(self.variant_ids), sorted(self.product_ids))
+
+
+def _version_key(user_id):
+    return f'favourites:ver:{user_id}'
+
+
+def _cache_key(user_id, version):
+    return f'favourites:v{FAVOURITES_CACHE_VERSION}:{user_id}:{version}'
+
+
+def _user_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # старт від часу: якщо ключ версії витіснено, старі записи не оживуть
+        cache.add(key, time.time_ns(), FAVOURITES_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def _load_user_state(user_id):
+    variant_ids, product_ids = [], []
+    rows = (Favourite.objects.filter(user_id=user_id)
+            .order_by()
+            .values_list('variant_id', 'product_id'))
+    for variant_id, product_id in rows:
+        if variant_id is not None:
+            variant_ids.append(variant_id)
+        else:
+            product_ids.append(product_id)
+    return FavouriteState(variant_ids, product_ids)
+
+
+def user_state(user_id):
+    version = _user_version(user_id)
+    if version is None:
+        return _load_user_state(user_id)
+    key = _cache_key(user_id, version)
+    cached = cache.get(key)
+    if cached is not None:
+        return FavouriteState(*cached)
+    # запис під старою версією після паралельної зміни вже ніхто не прочитає
+    state = _load_user_state(user_id)
+    cache.set(key, state.dump(), FAVOURITES_CACHE_TIMEOUT)
+    return state
+
+
+def invalidate_user(user_id):
+    key = _version_key(user_id)
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:  # ключа версії немає — наступне читання почне з нової
+            cache.add(key, time.time_ns(), FAVOURITES_CACHE_TIMEOUT)
+
+    transaction.on_commit(bump)
+
+
+def session_state(session):
+    return FavouriteState(
+        map(int, session.get('fav_variant_ids', [])),
+        map(int, session.get('fav_product_ids', [])),
+    )
+
+
+def clear_session_state(session):
+    for key in ('fav_variant_ids', 'fav_product_ids', 'fav_ids'):
+        session.pop(key, None)
+
+
+def favourite_state(request):
+    state = getattr(request, '_favourite_state', None)
+    if state is None:
+        if request.user.is_authenticated:
+            state = user_state(request.user.pk)
+        else:
+            state = session_state(request.session)
+        request._favourite_state = state
+    return state
+
+
+def set_favourite_state(request, state):
+    request._favourite_state = state
+    if not request.user.is_authenticated:
+        request.session['fav_variant_ids'] = sorted(state.variant_ids)
+        request.session['fav_product_ids'] = sorted(state.product_ids)
+
+
+def toggle_favourite(request, product, variant=None):
+    """
+    Додає/прибирає товар (або його варіант) з обраного.
+    Повертає ('added' | 'removed', новий FavouriteState).
+    """
+    if request.user.is_authenticated:
+        fav, created = Favourite.objects.get_or_create(
+            user=request.user, product=product, variant=variant
+        )
+        if not created:
+            fav.delete()
+        # сигнали вже підняли версію — стан з БД, з урахуванням паралельних змін
+        state = user_state(request.user.pk)
+        request._favourite_state = state
+        return ('added' if created else 'removed'), state
+
+    current = favourite_state(request)
+    variant_ids = set(current.variant_ids)
+    product_ids = set(current.product_ids)
+    if variant:
+        added = variant.id not in variant_ids
+    else:
+        added = product.id not in product_ids
+
+    target, key = (variant_ids, variant.id) if variant else (product_ids, product.id)
+    if added:
+        target.add(key)
+    else:
+        target.discard(key)
+
+    state = FavouriteState(variant_ids, product_ids)
+    set_favourite_state(request, state)
+    return ('added' if added else 'removed'), state
+
+
+def merge_session_favourites(user, session):
+    """
+    Переносить обране гостя з сесії в Favourite користувача.
+    Уже наявні записи пропускаються, неіснуючі id відкидаються.
+    'fav_ids' — старий ключ сесії (id товарів), читається для сумісності.
+    Повертає кількість створених записів.
+    """
+    guest = session_state(session)
+    legacy_ids = set(map(int, session.get('fav_ids', [])))
+    product_ids = guest.product_ids | legacy_ids
+    if not guest.variant_ids and not product_ids:
+        return 0
+
+    current = _load_user_state(user.pk)
+    new = [
+        Favourite(user=user, product_id=product_id, variant_id=variant_id)
+        for variant_id, product_id in (
+            Product_Variant.objects
+            .filter(pk__in=guest.variant_ids - current.variant_ids)
+            .values_list('pk', 'product_id')
+        )
+    ]
+    new += [
+        Favourite(user=user, product_id=product_id)
+        for product_id in (
+            Product.objects
+            .filter(pk__in=product_ids - current.product_ids)
+            .values_list('pk', flat=True)
+        )
+    ]
+    if new:
+        Favourite.objects.bulk_create(new, ignore_conflicts=True)
+
+    clear_session_state(session)
+    invalidate_user(user.pk)
+    return len(new)
@@ -1,12 +1,25 @@
+import logging
+
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from .models import Favourite
+from .services import invalidate_user, merge_session_favourites
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=Favourite)
+def drop_cached_favourites(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
 
 @receiver(user_logged_in)
 def merge_session_favs(sender, user, request, **kwargs):
-    ids = request.session.get('fav_ids', [])
-    for pid in ids:
-        Favourite.objects.get_or_create(user=user, product_id=pid)
-    if ids:
-        request.session['fav_ids'] = []
-        request.session.modified = True
+    if request is not None and hasattr(request, 'session'):
+        # збій злиття не повинен зривати логін: обране гостя лишається в сесії
+        try:
+            with transaction.atomic():
+                merge_session_favourites(user, request.session)
+        except Exception:
+            logger.exception('Не вдалося перенести обране гостя користувачу %s', user.pk)
@@ -1,10 +1,14 @@
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.shortcuts import render, get_object_or_404
 from .models import Favourite
+from .services import favourite_state, toggle_favourite
 from apps.products.models import Product, Product_Variant
 from django.views.decorators.http import require_http_methods
 
+from Laskazoo.throttle import throttle
+
 @require_http_methods(['POST', 'GET'])
+@throttle('fav_toggle', rate=(20, 10), dedup=1)
 def toggle(request, pk):
     product = get_object_or_404(Product, pk=pk)
 
@@ -15,54 +19,13 @@ def toggle(request, pk):
         if variant.product_id != product.id:
             return HttpResponseBadRequest('Variant does not belong to product')
 
-    if request.user.is_authenticated:
-        fav, created = Favourite.objects.get_or_create(
-            user=request.user, product=product, variant=variant
-        )
-        if created:
-            state = 'added'
-        else:
-            fav.delete()
-            state = 'removed'
-
-        count = Favourite.objects.filter(user=request.user).count()
-        request.session['fav_count'] = count
-        return JsonResponse({
-            'ok': True,
-            'state': state,
-            'count': count,
-            'variant': variant.id if variant else None,
-            'product': product.id,
-        })
-
-
-    fav_var_ids = set(map(int, request.session.get('fav_variant_ids', [])))
-    fav_prod_ids = set(map(int, request.session.get('fav_product_ids', [])))
-
-    if variant:
-        if variant.id in fav_var_ids:
-            fav_var_ids.remove(variant.id)
-            state = 'removed'
-        else:
-            fav_var_ids.add(variant.id)
-            state = 'added'
-    else:
-        if product.id in fav_prod_ids:
-            fav_prod_ids.remove(product.id)
-            state = 'removed'
-        else:
-            fav_prod_ids.add(product.id)
-            state = 'added'
-
-    request.session['fav_variant_ids'] = list(fav_var_ids)
-    request.session['fav_product_ids'] = list(fav_prod_ids)
-    total = len(fav_var_ids) + len(fav_prod_ids)
-
+    state, favs = toggle_favourite(request, product, variant)
     return JsonResponse({
         'ok': True,
         'state': state,
-        'count': total,
+        'count': favs.count,
         'variant': variant.id if variant else None,
+        'product': product.id,
     })
 
 
@@ -103,9 +66,4 @@ def favourite_list(request):
 
 def api_count(request):
     """Кількість улюблених для бейджика в шапці."""
-    if request.user.is_authenticated:
-        c = Favourite.objects.filter(user=request.user).count()
-    else:
-        c = len(request.session.get('fav_variant_ids', [])) + \
-            len(request.session.get('fav_product_ids', []))
-    return JsonResponse({'count': c})
\ No newline at end of file
+    return JsonResponse({'count': favourite_state(request).count})
\ No newline at end of file
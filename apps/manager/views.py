@@ -11,6 +11,9 @@ from apps.users.models import CustomUser
 from apps.orders.models import Order, OrderItem
 from apps.ts_ftps.models import TSGoods
 from apps.products.models import Product, Category, Main_Categories, Brand, PopularProduct, PopularCategory
+from apps.products.aggregates import refresh_product_aggregates
+from apps.products.caching import bump_catalog_version
+from apps.products.facets import refresh_brand_facets_for_products
 from apps.manager.models import Banner
 
 
@@ -254,6 +257,11 @@ def create_products_from_ts(request):
             except Exception as e:
                 errors.append(f"Помилка створення товару {good_id}: {str(e)}")
         
+        if created_products:
+            refresh_product_aggregates([p['id'] for p in created_products])
+            refresh_brand_facets_for_products([p['id'] for p in created_products])
+            bump_catalog_version()
+        
         return JsonResponse({
             'success': True,
             'created': len(created_products),
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Order, OrderItem, PaymentTransaction
+from .aggregates import refresh_order_totals
+from .models import Order, OrderItem, PaymentTransaction, StockReservation
+from .reservations import release_order
 
 
 class OrderItemInline(admin.TabularInline):
@@ -23,10 +25,10 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_number', 'user', 'full_name', 'phone', 'status', 
                     'payment_method_display', 'payment_status_display', 
                     'total_amount', 'created_at', 'exported')
-    list_filter = ('status', 'payment_method', 'payment_status', 'exported', 
+    list_filter = ('status', 'payment_method', 'payment_status', 'stock_shortage', 'exported', 
                    'sale_type', 'delivery_condition', 'created_at')
     search_fields = ('order_number', 'full_name', 'phone', 'email', 'user__username')
-    readonly_fields = ('order_number', 'total_amount', 'created_at', 'updated_at', 'exported_at')
+    readonly_fields = ('order_number', 'total_amount', 'items_count', 'created_at', 'updated_at', 'exported_at')
     inlines = [OrderItemInline, PaymentTransactionInline]
     
     fieldsets = (
@@ -40,7 +42,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('sale_type', 'delivery_condition', 'delivery_address', 'comment')
         }),
         ('Оплата', {
-            'fields': ('payment_method', 'payment_status', 'payment_id'),
+            'fields': ('payment_method', 'payment_status', 'payment_id', 'stock_shortage'),
             'classes': ('wide',)
         }),
         ('Експорт', {
@@ -48,13 +50,13 @@ class OrderAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Системна інформація', {
-            'fields': ('created_at', 'updated_at', 'total_amount'),
+            'fields': ('created_at', 'updated_at', 'total_amount', 'items_count'),
             'classes': ('collapse',)
         }),
     )
     
     actions = ['mark_as_processing', 'mark_as_shipped', 'mark_as_completed', 
-               'mark_payment_as_paid', 'export_selected']
+               'mark_as_canceled', 'mark_payment_as_paid', 'export_selected']
     
     def payment_method_display(self, obj):
         icons = {
@@ -95,6 +97,15 @@ class OrderAdmin(admin.ModelAdmin):
         self.message_user(request, f'{updated} замовлень позначено як "Виконане"')
     mark_as_completed.short_description = 'Позначити як "Виконане"'
     
+    def mark_as_canceled(self, request, queryset):
+        updated = 0
+        for order in queryset.exclude(status=Order.STATUS_CANCELED):
+            release_order(order)
+            updated += 1
+        queryset.update(status=Order.STATUS_CANCELED)
+        self.message_user(request, f'{updated} замовлень скасовано, резерви залишків знято')
+    mark_as_canceled.short_description = 'Скасувати (зняти резерв залишків)'
+    
     def mark_payment_as_paid(self, request, queryset):
         updated = queryset.filter(payment_method='card_online').update(payment_status='paid')
         self.message_user(request, f'{updated} оплат позначено як "Оплачено"')
@@ -106,18 +117,53 @@ class OrderAdmin(admin.ModelAdmin):
         self.message_user(request, 'Замовлення експортовано')
     export_selected.short_description = 'Експортувати в JSON'
     
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        refresh_order_totals([form.instance.pk])
+
     def get_queryset(self, request):
+        # сума й кількість позицій — колонки Order, позиції для списку не потрібні;
+        # інлайни на сторінці замовлення вибирають їх своїм запитом
         qs = super().get_queryset(request)
-        return qs.select_related('user').prefetch_related('items__product', 'items__variant')
+        return qs.select_related('user')
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'product', 'variant', 'quantity', 'retail_price', 'line_total')
+    # __str__ варіанта бере назву товару
+    list_select_related = ('order', 'product', 'variant__product')
     list_filter = ('order__status', 'order__created_at')
     search_fields = ('order__order_number', 'product__name', 'variant__sku')
     readonly_fields = ('line_total',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_order_totals([obj.order_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_order_totals([obj.order_id])
+
+    def delete_queryset(self, request, queryset):
+        order_ids = list(queryset.values_list('order_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_order_totals(order_ids)
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'variant', 'quantity', 'status', 'expires_at', 'created_at')
+    list_select_related = ('order', 'product', 'variant__product')
+    list_filter = ('status',)
+    search_fields = ('order__order_number', 'variant__sku', 'product__name')
+    # статус і кількість змінюються лише через apps.orders.reservations,
+    # інакше reserved_quantity розійдеться з резервами
+    readonly_fields = ('order', 'product', 'variant', 'quantity', 'status', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
 
 @admin.register(PaymentTransaction)
 class PaymentTransactionAdmin(admin.ModelAdmin):
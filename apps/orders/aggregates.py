@@ -0,0 +1,56 @@
+"""
+Денормалізовані підсумки замовлення.
+
+Order.total_amount — сума quantity * retail_price позицій,
+Order.items_count  — кількість позицій.
+
+Звіти, адмінка та оплата читають колонки напряму, сортують і фільтрують
+по сумі в SQL, без проходу по items.all() для кожного замовлення.
+"""
+from decimal import Decimal
+
+from django.db.models import (
+    Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem
+
+TOTALS_BATCH_SIZE = 1000
+
+
+def _totals_update():
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    line_total = ExpressionWrapper(
+        F('quantity') * F('retail_price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    return {
+        'total_amount': Coalesce(
+            Subquery(items.annotate(s=Sum(line_total)).values('s')[:1]),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        'items_count': Coalesce(
+            Subquery(items.annotate(c=Count('pk')).values('c')[:1]),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+    }
+
+
+def refresh_order_totals(order_ids=None, batch_size=TOTALS_BATCH_SIZE):
+    """
+    Перераховує total_amount / items_count одним UPDATE на пачку замовлень
+    (або на всі, якщо order_ids is None). Повертає кількість оновлених рядків.
+    """
+    if order_ids is None:
+        return Order.objects.update(**_totals_update())
+
+    ids = sorted({int(pk) for pk in order_ids if pk})
+    total = 0
+    for i in range(0, len(ids), batch_size):
+        total += (Order.objects
+                  .filter(id__in=ids[i:i + batch_size])
+                  .update(**_totals_update()))
+    return total
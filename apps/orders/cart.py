@@ -0,0 +1,169 @@
+"""
+Додавання в кошик залогіненого користувача однією транзакцією.
+
+Кошик (Order зі статусом cart) блокується select_for_update, тож
+паралельні кліки по одному кошику виконуються по черзі; частковий UNIQUE
+(user) WHERE status = 'cart' не дає двом першим клікам створити два кошики.
+Залишок перечитується вже під блокуванням, кількість збільшується
+UPDATE ... SET quantity = quantity + 1 з умовою по складу,
+а UNIQUE (order, product, variant) не дає з'явитися дублю позиції.
+Підсумок кошика рахується в тій самій транзакції і пишеться в cart_cache.
+
+merge_session_cart переносить кошик гостя (session_cart) в кошик
+користувача при логіні: фіксована кількість запитів незалежно від
+кількості позицій — по одному INSERT ... ON CONFLICT DO UPDATE
+(сумування кількості) для варіантів і для товарів без варіанта.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+
+from apps.products.models import Product, Product_Variant
+
+from . import session_cart
+from .cart_cache import refresh_cart_summary
+from .models import Order, OrderItem
+
+
+class CartError(Exception):
+    """Додавання відхилено (немає в наявності / перевищено склад)."""
+
+
+_EMPTY_CART = {
+    'full_name': '',
+    'phone': '',
+    'email': '',
+    'delivery_condition': '',
+    'delivery_address': '',
+    'comment': '',
+}
+
+
+def _locked_cart(user):
+    """
+    Кошик користувача під блокуванням. Кошик із заповненими контактами
+    (залишок невдалого оформлення) видаляється і створюється чистий.
+    Якщо кошика ще немає, паралельний запит, що програв INSERT
+    (IntegrityError по orders_order_one_cart), get_or_create дочитує вже
+    створений кошик під тим самим блокуванням.
+    """
+    carts = Order.objects.select_for_update()
+    order, _ = carts.get_or_create(user=user, status=Order.STATUS_CART, defaults=_EMPTY_CART)
+    if order.full_name or order.phone or order.email:
+        order.delete()
+        order = Order.objects.create(user=user, status=Order.STATUS_CART, **_EMPTY_CART)
+    return order
+
+
+def available_stock(product, variant=None):
+    """Доступний залишок (склад − резерви) свіжим читанням з БД."""
+    model, pk = (Product_Variant, variant.pk) if variant is not None else (Product, product.pk)
+    return (model.objects
+            .filter(pk=pk)
+            .values_list(F('warehouse_quantity') - F('reserved_quantity'), flat=True)
+            .first())
+
+
+def add_to_cart(user, product, variant=None, qty=1):
+    """
+    +qty товару/варіанту в кошик. Повертає (count, qty, total) кошика.
+    CartError — якщо на складі не вистачає.
+    """
+    price = variant.retail_price if variant is not None else product.retail_price
+
+    with transaction.atomic():
+        order = _locked_cart(user)
+        # під блокуванням кошика: залишок, прочитаний до транзакції, міг застаріти
+        stock = available_stock(product, variant) or 0
+        if stock < qty:
+            raise CartError('Немає в наявності' if stock <= 0 else f'Доступно лише {stock} шт.')
+
+        item, created = OrderItem.objects.get_or_create(
+            order=order, product=product, variant=variant,
+            defaults={'retail_price': price or 0, 'quantity': qty},
+        )
+        if not created:
+            update = {'quantity': F('quantity') + qty}
+            if price is not None:
+                update['retail_price'] = price
+            items = OrderItem.objects.filter(pk=item.pk, quantity__lte=stock - qty)
+            if not items.update(**update):
+                raise CartError(f'Доступно лише {stock} шт.')
+
+        return refresh_cart_summary(user.pk, order.pk)
+
+
+def _upsert_sql(rows, conflict):
+    table = connection.ops.quote_name(OrderItem._meta.db_table)
+    variants = connection.ops.quote_name(Product_Variant._meta.db_table)
+    products = connection.ops.quote_name(Product._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    # сума з тим, що вже в кошику, але не більше доступного (склад − резерви)
+    # варіанта, а для позиції без варіанта — товару
+    return f"""
+        INSERT INTO {table} (order_id, product_id, variant_id, quantity, retail_price)
+        VALUES {values}
+        ON CONFLICT {conflict} DO UPDATE SET
+            quantity = GREATEST(1, LEAST(
+                {table}.quantity + EXCLUDED.quantity,
+                COALESCE(
+                    (SELECT v.warehouse_quantity - v.reserved_quantity FROM {variants} v
+                     WHERE v.id = EXCLUDED.variant_id),
+                    (SELECT p.warehouse_quantity - p.reserved_quantity FROM {products} p
+                     WHERE p.id = EXCLUDED.product_id)
+                )
+            )),
+            retail_price = EXCLUDED.retail_price
+    """, [value for row in rows for value in row]
+
+
+def merge_session_cart(user, session):
+    """
+    Переносить позиції кошика гостя в кошик користувача і очищає
+    session_cart. Ціни — актуальні з БД; варіанти без залишку та
+    видалені товари пропускаються. Повертає кількість перенесених позицій.
+    """
+    lines = list(session_cart.items(session))
+    if not lines:
+        return 0
+
+    variant_qty, product_qty = {}, {}
+    for it in lines:
+        target = variant_qty if it.kind == 'variant' else product_qty
+        target[it.id] = target.get(it.id, 0) + max(1, it.qty)
+
+    variants = (Product_Variant.objects
+                .filter(pk__in=variant_qty, warehouse_quantity__gt=F('reserved_quantity'))
+                .annotate(available=F('warehouse_quantity') - F('reserved_quantity'))
+                .values_list('pk', 'product_id', 'retail_price', 'available')
+                if variant_qty else [])
+    products = (Product.objects
+                .filter(pk__in=product_qty, warehouse_quantity__gt=F('reserved_quantity'))
+                .annotate(available=F('warehouse_quantity') - F('reserved_quantity'))
+                .values_list('pk', 'retail_price', 'available')
+                if product_qty else [])
+
+    with transaction.atomic():
+        order = _locked_cart(user)
+        variant_rows = [
+            (order.pk, product_id, pk, min(variant_qty[pk], stock), price or 0)
+            for pk, product_id, price, stock in variants
+        ]
+        product_rows = [
+            (order.pk, pk, None, min(product_qty[pk], stock), price or 0)
+            for pk, price, stock in products
+        ]
+        with connection.cursor() as cursor:
+            if variant_rows:
+                cursor.execute(*_upsert_sql(
+                    variant_rows,
+                    '(order_id, product_id, variant_id) WHERE variant_id IS NOT NULL',
+                ))
+            if product_rows:
+                cursor.execute(*_upsert_sql(
+                    product_rows,
+                    '(order_id, product_id) WHERE variant_id IS NULL',
+                ))
+        refresh_cart_summary(user.pk, order.pk)
+
+    session_cart.clear(session)
+    return len(variant_rows) + len(product_rows)
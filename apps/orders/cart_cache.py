@@ -0,0 +1,85 @@
+"""
+Кешований підсумок кошика користувача: (позицій, штук, сума).
+
+Шапка сайту показує кошик на кожній сторінці, тому cart_summary
+context processor і api_cart_summary читають підсумок з кешу.
+При промаху — один агрегатний запит по позиціях кошика, без запису в БД.
+
+Кеш — спільний Redis (settings.CACHES), тож підсумок, записаний одним
+воркером, бачать усі. Усі мутації кошика (orders.views, orders.cart) після
+зміни викликають refresh_cart_summary() (write-through): він пише
+total_amount / items_count у рядок кошика Order, а в кеш — лише після
+коміту транзакції, щоб відкат не лишив у шапці чужий підсумок. Зміни Order
+(оформлення, видалення кошика, адмінка) скидають ключ через orders.signals,
+теж після коміту; TTL — запобіжник для правок позицій в обхід в'юх.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+
+from .models import Order, OrderItem
+
+CART_CACHE_VERSION = 1
+CART_CACHE_TIMEOUT = 60 * 10
+
+
+def _cache_key(user_id):
+    return f'cart:summary:v{CART_CACHE_VERSION}:{user_id}'
+
+
+def _cart_id(user_id, order_id=None):
+    if order_id is not None:
+        return order_id
+    return (Order.objects
+            .filter(user_id=user_id, status=Order.STATUS_CART)
+            .order_by('pk')
+            .values('pk')[:1])
+
+
+def compute_cart_summary(user_id, order_id=None):
+    """
+    (count, qty, total) одним запитом по позиціях першого кошика користувача
+    (або кошика order_id, якщо він уже відомий).
+    """
+    cart_id = _cart_id(user_id, order_id)
+    line_total = ExpressionWrapper(
+        F('quantity') * F('retail_price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    agg = OrderItem.objects.filter(order_id=cart_id).aggregate(
+        count=Count('id'), qty=Sum('quantity'), total=Sum(line_total),
+    )
+    return agg['count'] or 0, agg['qty'] or 0, agg['total'] or Decimal('0')
+
+
+def cart_summary_for(user_id):
+    cached = cache.get(_cache_key(user_id))
+    if cached is not None:
+        count, qty, total = cached
+        return count, qty, Decimal(total)
+    # промах на читанні: лише агрегат і кеш, рядок Order пишуть мутації
+    count, qty, total = compute_cart_summary(user_id)
+    _store(user_id, count, qty, total)
+    return count, qty, total
+
+
+def _store(user_id, count, qty, total):
+    key, value = _cache_key(user_id), (count, qty, str(total))
+    transaction.on_commit(lambda: cache.set(key, value, CART_CACHE_TIMEOUT))
+
+
+def refresh_cart_summary(user_id, order_id=None):
+    count, qty, total = compute_cart_summary(user_id, order_id)
+    Order.objects.filter(pk=_cart_id(user_id, order_id)).update(
+        total_amount=total, items_count=count,
+    )
+    _store(user_id, count, qty, total)
+    return count, qty, total
+
+
+def invalidate_cart_summary(user_id):
+    # після коміту: інакше паралельний запит встигне закешувати ще старий кошик
+    key = _cache_key(user_id)
+    transaction.on_commit(lambda: cache.delete(key))
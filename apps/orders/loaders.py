@@ -0,0 +1,46 @@
+"""
+Завантаження замовлень для сторінок кошика, оформлення та історії.
+
+with_items() додає до queryset замовлень prefetch позицій разом з товаром
+і варіантом (лише поля, які показують шаблони) — один запит на всі позиції
+всіх замовлень — та суму рядка (line_sum), пораховану в SQL.
+OrderItem.line_total бере цю анотацію, якщо вона є; сума замовлення —
+збережена колонка Order.total_amount (див. aggregates).
+Шаблони рендеряться за фіксовану кількість запитів.
+"""
+from django.db.models import DecimalField, ExpressionWrapper, F, Prefetch
+
+from .models import Order, OrderItem
+
+ITEM_FIELDS = (
+    'id', 'order_id', 'product', 'variant', 'quantity', 'retail_price',
+    'product__name', 'product__slug', 'product__image',
+    'variant__product_id', 'variant__sku', 'variant__weight', 'variant__size',
+    'variant__image', 'variant__warehouse_quantity',
+)
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _line_total():
+    return ExpressionWrapper(F('quantity') * F('retail_price'), output_field=MONEY)
+
+
+def items_queryset():
+    return (OrderItem.objects
+            .select_related('product', 'variant')
+            .only(*ITEM_FIELDS)
+            .annotate(line_sum=_line_total())
+            .order_by('pk'))
+
+
+def with_items(orders):
+    """queryset Order -> з позиціями для рендеру."""
+    return orders.prefetch_related(Prefetch('items', queryset=items_queryset()))
+
+
+def load_cart(user):
+    """Кошик користувача з позиціями (або None)."""
+    return (with_items(Order.objects.filter(user=user, status=Order.STATUS_CART))
+            .order_by('pk')
+            .first())
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.orders.aggregates import TOTALS_BATCH_SIZE, refresh_order_totals
+from apps.orders.models import Order
+
+
+class Command(BaseCommand):
+    help = "Перераховує Order.total_amount / items_count з позицій замовлень"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='*', type=int,
+                            help='Перерахувати лише вказані Order.id')
+        parser.add_argument('--batch-size', type=int, default=TOTALS_BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        ids = opts.get('ids')
+        if not ids:
+            ids = Order.objects.order_by('pk').values_list('pk', flat=True)
+        total = refresh_order_totals(ids, batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Підсумки замовлень оновлено: замовлень = {total}"))
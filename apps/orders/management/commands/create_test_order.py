@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from apps.orders.aggregates import refresh_order_totals
 from apps.orders.models import Order, OrderItem
 from apps.products.models import Product
 from decimal import Decimal
@@ -46,6 +47,7 @@ class Command(BaseCommand):
             quantity=2,
             retail_price=Decimal('199.50')
         )
+        refresh_order_totals([order.pk])
         
         self.stdout.write(
             self.style.SUCCESS(
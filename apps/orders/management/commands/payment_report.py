@@ -5,7 +5,8 @@ Management команда для генерації звітів по оплат
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Sum, Q, Value
+from django.db.models.functions import Coalesce
 from apps.orders.models import Order
 from decimal import Decimal
 
@@ -50,23 +51,21 @@ class Command(BaseCommand):
         pending_orders = orders.filter(payment_status='pending').count()
         failed_orders = orders.filter(payment_status='failed').count()
         
-        # Суми
-        total_amount = sum(order.total_amount for order in orders)
-        
-        cash_amount = sum(
-            order.total_amount 
-            for order in orders.filter(payment_method='cash')
-        )
-        
-        card_paid_amount = sum(
-            order.total_amount 
-            for order in orders.filter(payment_method='card_online', payment_status='paid')
-        )
-        
-        card_pending_amount = sum(
-            order.total_amount 
-            for order in orders.filter(payment_method='card_online', payment_status='pending')
+        # Суми — одним агрегатом по збереженому Order.total_amount
+        amounts = orders.aggregate(
+            total=Coalesce(Sum('total_amount'), Value(Decimal('0'))),
+            cash=Coalesce(Sum('total_amount', filter=Q(payment_method='cash')), Value(Decimal('0'))),
+            card_paid=Coalesce(Sum('total_amount', filter=Q(payment_method='card_online',
+                                                            payment_status='paid')),
+                               Value(Decimal('0'))),
+            card_pending=Coalesce(Sum('total_amount', filter=Q(payment_method='card_online',
+                                                               payment_status='pending')),
+                                  Value(Decimal('0'))),
         )
+        total_amount = amounts['total']
+        cash_amount = amounts['cash']
+        card_paid_amount = amounts['card_paid']
+        card_pending_amount = amounts['card_pending']
         
         # Виводимо звіт
         self.stdout.write(f'\n📦 ЗАГАЛЬНА СТАТИСТИКА:')
@@ -106,7 +105,9 @@ class Command(BaseCommand):
             
             day_orders = orders.filter(created_at__range=[day_start, day_end])
             day_count = day_orders.count()
-            day_amount = sum(order.total_amount for order in day_orders)
+            day_amount = day_orders.aggregate(
+                s=Coalesce(Sum('total_amount'), Value(Decimal('0')))
+            )['s']
             
             day_paid = day_orders.filter(
                 payment_method='card_online', 
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """Зливає дублікати позицій (order, product, variant) в один рядок перед UNIQUE."""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    dupes = (OrderItem.objects
+             .values('order_id', 'product_id', 'variant_id')
+             .annotate(n=Count('id'), keep=Min('id'), qty=Sum('quantity'))
+             .filter(n__gt=1)
+             .order_by())
+    for row in dupes:
+        group = OrderItem.objects.filter(
+            order_id=row['order_id'], product_id=row['product_id'], variant_id=row['variant_id'],
+        )
+        group.exclude(id=row['keep']).delete()
+        OrderItem.objects.filter(id=row['keep']).update(quantity=row['qty'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('variant__isnull', False)), fields=('order', 'product', 'variant'), name='orders_item_uniq_variant'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('variant__isnull', True)), fields=('order', 'product'), name='orders_item_uniq_product'),
+        ),
+    ]
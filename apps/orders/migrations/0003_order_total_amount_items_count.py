@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:20
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import (
+    Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    """Той самий UPDATE, що й aggregates.refresh_order_totals() (команда backfill_order_totals)."""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    line_total = ExpressionWrapper(
+        F('quantity') * F('retail_price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    Order.objects.update(
+        total_amount=Coalesce(
+            Subquery(items.annotate(s=Sum(line_total)).values('s')[:1]),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        items_count=Coalesce(
+            Subquery(items.annotate(c=Count('pk')).values('c')[:1]),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_orderitem_unique_line'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(db_default=Decimal('0.00'), db_index=True, decimal_places=2, editable=False, max_digits=12, verbose_name='Сума'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(db_default=0, editable=False, verbose_name='Позицій'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_total_amount_items_count'),
+        ('products', '0006_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('active', 'Активний'), ('committed', 'Списаний'), ('released', 'Знятий')], default='active', max_length=16)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='orders.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product_variant')),
+            ],
+            options={
+                'verbose_name': 'Резерв залишку',
+                'verbose_name_plural': 'Резерви залишків',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='orders_resv_status_exp')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_shortage',
+            field=models.BooleanField(db_default=False, verbose_name='Нестача залишку'),
+        ),
+    ]
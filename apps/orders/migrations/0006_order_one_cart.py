@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_carts(apps, schema_editor):
+    """Лишає користувачу найстаріший кошик (його й брав _locked_cart), решту видаляє."""
+    Order = apps.get_model('orders', 'Order')
+    dupes = (Order.objects
+             .filter(status='cart')
+             .values('user_id')
+             .annotate(n=Count('id'), keep=Min('id'))
+             .filter(n__gt=1)
+             .order_by())
+    for row in dupes:
+        (Order.objects
+         .filter(user_id=row['user_id'], status='cart')
+         .exclude(id=row['keep'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_stock_shortage'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cart')), fields=('user',), name='orders_order_one_cart'),
+        ),
+    ]
@@ -74,11 +74,26 @@ class Order(models.Model):
     first_name = models.CharField(max_length=100, blank=True)
     city = models.CharField(max_length=100, blank=True)
 
+    # Денормалізовані підсумки позицій. Перераховуються aggregates.refresh_order_totals()
+    # (і cart_cache.refresh_cart_summary() для кошика) після кожної зміни позицій.
+    total_amount = models.DecimalField(
+        "Сума", max_digits=12, decimal_places=2,
+        db_default=Decimal('0.00'), db_index=True, editable=False,
+    )
+    items_count = models.PositiveIntegerField("Позицій", db_default=0, editable=False)
+    # Оплата прийшла, коли резерв уже знято, а залишку на повторне
+    # резервування не вистачило (reservations.confirm_order) — перевірити вручну.
+    stock_shortage = models.BooleanField("Нестача залишку", db_default=False)
 
-
-    @property
-    def total_amount(self):
-        return sum(item.line_total for item in self.items.all())
+    class Meta:
+        # один кошик на користувача: паралельні перші додавання не створять два
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status='cart'),
+                name='orders_order_one_cart',
+            ),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.order_number and self.status != self.STATUS_CART:
@@ -102,6 +117,22 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     retail_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        # один рядок на товар/варіант у замовленні; NULL-варіант окремою умовою,
+        # бо в UNIQUE NULL-и між собою різні
+        constraints = [
+            models.UniqueConstraint(
+                fields=['order', 'product', 'variant'],
+                condition=models.Q(variant__isnull=False),
+                name='orders_item_uniq_variant',
+            ),
+            models.UniqueConstraint(
+                fields=['order', 'product'],
+                condition=models.Q(variant__isnull=True),
+                name='orders_item_uniq_product',
+            ),
+        ]
+
     def save(self, *args, **kwargs):
 
         if self.variant and self.variant.product_id != self.product_id:
@@ -110,6 +141,9 @@ class OrderItem(models.Model):
 
     @property
     def line_total(self):
+        # line_sum — анотація з loaders.items_queryset
+        if hasattr(self, 'line_sum'):
+            return self.line_sum
         retail_price = self.retail_price or Decimal('0')
         return retail_price * self.quantity
 
@@ -118,6 +152,44 @@ class OrderItem(models.Model):
         return f'{self.product.name}{suffix} ×{self.quantity}'
 
 
+class StockReservation(models.Model):
+    """
+    Резерв залишку під оформлене замовлення (apps.orders.reservations).
+    active    — кількість врахована в reserved_quantity товару/варіанта;
+    committed — замовлення вже враховане залишком з Торгсофту (після синхронізації);
+    released  — резерв знято (скасування, невдала оплата, закінчився TTL).
+    """
+    STATUS_ACTIVE = 'active'
+    STATUS_COMMITTED = 'committed'
+    STATUS_RELEASED = 'released'
+
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, 'Активний'),
+        (STATUS_COMMITTED, 'Списаний'),
+        (STATUS_RELEASED, 'Знятий'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='reservations', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    variant = models.ForeignKey(Product_Variant, related_name='+', null=True, blank=True,
+                                on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Резерв залишку'
+        verbose_name_plural = 'Резерви залишків'
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='orders_resv_status_exp'),
+        ]
+
+    def __str__(self):
+        target = f'v={self.variant_id}' if self.variant_id else f'p={self.product_id}'
+        return f'#{self.order_id} {target} ×{self.quantity} ({self.status})'
+
+
 class PaymentTransaction(models.Model):
     """
     Модель для логування всіх платіжних транзакцій
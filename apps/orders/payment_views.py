@@ -18,6 +18,7 @@ from django.template.loader import render_to_string
 from django.core.mail import EmailMultiAlternatives
 
 from .models import Order, PaymentTransaction
+from .reservations import confirm_order, release_order
 
 
 # ========== НАЛАШТУВАННЯ PORTMONE ==========
@@ -108,6 +109,7 @@ def payment_success(request, order_id):
     if order.payment_status == 'pending':
         order.payment_status = 'paid'
         order.save()
+        confirm_order(order)
         
         # Оновлюємо транзакцію
         transaction = order.transactions.filter(status='initiated').order_by('-created_at').first()
@@ -135,6 +137,7 @@ def payment_failure(request, order_id):
     if order.payment_status == 'pending':
         order.payment_status = 'failed'
         order.save()
+        release_order(order)
         
         # Оновлюємо транзакцію
         transaction = order.transactions.filter(status='initiated').order_by('-created_at').first()
@@ -193,6 +196,7 @@ def payment_callback(request):
             order.payment_status = 'paid'
             order.payment_id = payment_id
             order.save()
+            confirm_order(order)
             
             callback_transaction.mark_as_success(response_data=data)
             
@@ -212,6 +216,7 @@ def payment_callback(request):
         else:
             order.payment_status = 'failed'
             order.save()
+            release_order(order)
             
             error_msg = data.get('ERROR_MESSAGE', 'Оплата не пройшла')
             callback_transaction.mark_as_failed(error_message=error_msg, response_data=data)
@@ -0,0 +1,182 @@
+"""
+Резервування залишків під оформлені замовлення.
+
+Торгсофт оновлює warehouse_quantity лише при синхронізації (sync_ts_direct),
+тому між синхронізаціями оформлені замовлення тримають резерв:
+reserved_quantity товару/варіанта + рядок StockReservation з TTL.
+
+reserve_order — на кожну позицію один умовний UPDATE
+    SET reserved_quantity = reserved_quantity + qty
+    WHERE warehouse_quantity >= reserved_quantity + qty
+  (блокується лише рядок товару; 0 оновлених рядків — залишку не вистачає,
+  транзакція відкочується). Позиції обробляються у фіксованому порядку id,
+  щоб паралельні оформлення не взаємоблокувались.
+release_order / confirm_order — скасування або невдала оплата / успішна оплата.
+  Оплата, що прийшла після PAYMENT_TTL, резервує наново; якщо залишку вже
+  немає — замовлення позначається stock_shortage.
+release_expired — зняття резервів із простроченим TTL (celery beat).
+reconcile_reservations — після sync_ts_direct: резерви замовлень, які вже
+  пішли в Торгсофт, списуються (залишок з файлу їх уже враховує),
+  скасовані та прострочені — знімаються.
+
+Усі зміни reserved_quantity — дельти через F(), без перерахунку
+«з нуля», тож паралельні оформлення під час reconcile не губляться.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from apps.products.models import Product, Product_Variant
+
+from .models import Order, StockReservation
+
+logger = logging.getLogger(__name__)
+
+# оплата карткою: час на оплату, далі резерв знімається
+PAYMENT_TTL = timedelta(minutes=30)
+# готівка / оплачено: до експорту в Торгсофт і наступної синхронізації
+CONFIRMED_TTL = timedelta(days=3)
+# замовлення, експортоване пізніше ніж за стільки до синхронізації,
+# могло ще не потрапити у файл залишків — резерв лишається до наступної
+SYNC_LAG = timedelta(minutes=15)
+
+
+class StockError(Exception):
+    """Залишку не вистачає для позиції замовлення."""
+
+    def __init__(self, item, available):
+        self.item = item
+        self.available = max(0, available)
+        name = item.product.name or item.product_id
+        super().__init__(
+            f'{name}: немає в наявності' if self.available <= 0
+            else f'{name}: доступно лише {self.available} шт.'
+        )
+
+
+def _reserve_line(model, pk, qty):
+    return (model.objects
+            .filter(pk=pk, warehouse_quantity__gte=F('reserved_quantity') + qty)
+            .update(reserved_quantity=F('reserved_quantity') + qty))
+
+
+def _unreserve(by_variant, by_product):
+    for model, amounts in ((Product_Variant, by_variant), (Product, by_product)):
+        for pk in sorted(amounts):
+            model.objects.filter(pk=pk).update(
+                reserved_quantity=Greatest(F('reserved_quantity') - amounts[pk], 0)
+            )
+
+
+def reserve_order(order, ttl=CONFIRMED_TTL):
+    """
+    Резервує всі позиції замовлення або жодну (StockError).
+    Викликати в тій самій транзакції, що й зміну статусу замовлення.
+    """
+    items = list(order.items.select_related('product', 'variant'))
+    # фіксований порядок блокувань: спершу варіанти, потім товари, за id
+    items.sort(key=lambda it: (it.variant_id is None, it.variant_id or it.product_id))
+    expires_at = timezone.now() + ttl
+
+    with transaction.atomic():
+        for item in items:
+            if item.variant_id:
+                model, pk, stock = Product_Variant, item.variant_id, item.variant
+            else:
+                model, pk, stock = Product, item.product_id, item.product
+            if not _reserve_line(model, pk, item.quantity):
+                stock.refresh_from_db(fields=['warehouse_quantity', 'reserved_quantity'])
+                raise StockError(item, stock.available_quantity)
+
+        StockReservation.objects.bulk_create([
+            StockReservation(
+                order=order, product_id=item.product_id, variant_id=item.variant_id,
+                quantity=item.quantity, expires_at=expires_at,
+            )
+            for item in items
+        ])
+
+
+def _finish(reservations, status):
+    """Знімає активні резерви з reserved_quantity і переводить їх у status."""
+    with transaction.atomic():
+        rows = list(
+            reservations.filter(status=StockReservation.STATUS_ACTIVE)
+            .select_for_update(skip_locked=True, of=('self',))
+            .values_list('pk', 'variant_id', 'product_id', 'quantity')
+        )
+        if not rows:
+            return 0
+        by_variant, by_product = defaultdict(int), defaultdict(int)
+        for _, variant_id, product_id, qty in rows:
+            if variant_id:
+                by_variant[variant_id] += qty
+            else:
+                by_product[product_id] += qty
+        _unreserve(by_variant, by_product)
+        StockReservation.objects.filter(pk__in=[r[0] for r in rows]).update(status=status)
+    return len(rows)
+
+
+def release_order(order):
+    return _finish(StockReservation.objects.filter(order=order), StockReservation.STATUS_RELEASED)
+
+
+def confirm_order(order):
+    """
+    Оплачене замовлення тримає резерв до синхронізації.
+    Повертає True, якщо резерв є (продовжено / створено наново).
+    """
+    with transaction.atomic():
+        # success-сторінка і callback можуть прийти одночасно — по черзі
+        list(Order.objects.select_for_update().filter(pk=order.pk).values_list('pk'))
+        extended = (StockReservation.objects
+                    .filter(order=order, status=StockReservation.STATUS_ACTIVE)
+                    .update(expires_at=timezone.now() + CONFIRMED_TTL))
+        if extended or order.reservations.filter(
+                status=StockReservation.STATUS_COMMITTED).exists():
+            return True
+        if order.status == Order.STATUS_CANCELED:
+            return False
+        # резерв прострочено (оплата після PAYMENT_TTL) — резервуємо наново
+        try:
+            reserve_order(order, ttl=CONFIRMED_TTL)
+        except StockError as exc:
+            logger.warning('Оплачене замовлення %s без резерву: %s', order.pk, exc)
+            Order.objects.filter(pk=order.pk).update(stock_shortage=True)
+            order.stock_shortage = True
+            return False
+    return True
+
+
+def release_expired(now=None):
+    now = now or timezone.now()
+    return _finish(
+        StockReservation.objects.filter(expires_at__lt=now),
+        StockReservation.STATUS_RELEASED,
+    )
+
+
+def reconcile_reservations(synced_at=None):
+    """
+    Після синхронізації залишків з Торгсофту.
+    Повертає (списано, знято).
+    """
+    synced_at = synced_at or timezone.now()
+    committed = _finish(
+        StockReservation.objects.filter(
+            order__exported=True, order__exported_at__lte=synced_at - SYNC_LAG,
+        ),
+        StockReservation.STATUS_COMMITTED,
+    )
+    released = _finish(
+        StockReservation.objects.filter(order__status=Order.STATUS_CANCELED),
+        StockReservation.STATUS_RELEASED,
+    )
+    released += release_expired(synced_at)
+    return committed, released
@@ -1,9 +1,24 @@
+"""
+Кошик гостя в сесії.
+
+Формат: {"v:<variant_id>" | "p:<product_id>": {"qty": int, "price": str}} —
+словник за ключем позиції, тож додавання / зміна / видалення — O(1)
+без проходу по списку. Старий формат (список словників kind/id/qty/price)
+конвертується при першому зверненні, дублікати позицій зливаються.
+
+URL-и модалки приймають <int:item_id>, тому позиція адресується
+числовим sid = id * 2 + (0 для варіанта, 1 для товару) — див. line_sid / parse_sid.
+"""
 from decimal import Decimal
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, Optional, Tuple
 
 CART_KEY = "cart"
 
+KINDS = {"variant": "v", "product": "p"}
+_KIND_BY_PREFIX = {prefix: kind for kind, prefix in KINDS.items()}
+
+
 @dataclass
 class CartItem:
     kind: str
@@ -11,69 +26,123 @@ class CartItem:
     qty: int
     price: Decimal
 
-def _normalize(session):
-    if CART_KEY not in session or not isinstance(session[CART_KEY], list):
-        session[CART_KEY] = []
-        session.modified = True
+    @property
+    def sid(self) -> int:
+        return line_sid(self.kind, self.id)
 
-def add_item(session, kind: str, obj_id: int, price: Decimal, inc: int = 1):
-    _normalize(session)
-    items: List[Dict] = session[CART_KEY]
+
+def line_key(kind: str, obj_id: int) -> str:
+    return f"{KINDS[kind]}:{int(obj_id)}"
+
+
+def line_sid(kind: str, obj_id: int) -> int:
+    return int(obj_id) * 2 + (1 if kind == "product" else 0)
+
+
+def parse_sid(sid: int) -> Tuple[str, int]:
+    sid = int(sid)
+    return ("product" if sid % 2 else "variant"), sid // 2
+
+
+def _from_list(items) -> Dict[str, Dict]:
+    lines: Dict[str, Dict] = {}
     for it in items:
-        if it.get("kind") == kind and it.get("id") == obj_id:
-            it["qty"] = int(it.get("qty", 1)) + inc
-            session.modified = True
-            return
-    items.append({"kind": kind, "id": int(obj_id), "qty": int(inc), "price": str(price)})
+        if not isinstance(it, dict) or it.get("kind") not in KINDS:
+            continue
+        try:
+            key = line_key(it["kind"], it["id"])
+            qty = int(it.get("qty", 1))
+        except (KeyError, TypeError, ValueError):
+            continue
+        line = lines.setdefault(key, {"qty": 0, "price": str(it.get("price", "0"))})
+        line["qty"] += qty
+    return lines
+
+
+def _lines(session, create: bool = False) -> Dict[str, Dict]:
+    """Словник позицій. Читання без кошика не створює його в сесії."""
+    cart = session.get(CART_KEY)
+    if isinstance(cart, dict):
+        return cart
+    if cart is None and not create:
+        return {}
+    session[CART_KEY] = _from_list(cart) if isinstance(cart, list) else {}
     session.modified = True
+    return session[CART_KEY]
+
+
+def items(session) -> Iterator[CartItem]:
+    """Позиції у порядку додавання."""
+    for key, line in _lines(session).items():
+        prefix, _, obj_id = key.partition(":")
+        yield CartItem(
+            kind=_KIND_BY_PREFIX[prefix],
+            id=int(obj_id),
+            qty=int(line.get("qty", 1)),
+            price=Decimal(line.get("price", "0")),
+        )
+
+
+def get_item(session, kind: str, obj_id: int) -> Optional[Dict]:
+    return _lines(session).get(line_key(kind, obj_id))
+
+
+def add_item(session, kind: str, obj_id: int, price: Decimal, inc: int = 1):
+    lines = _lines(session, create=True)
+    key = line_key(kind, obj_id)
+    line = lines.get(key)
+    if line is not None:
+        line["qty"] = int(line.get("qty", 1)) + inc
+    else:
+        lines[key] = {"qty": int(inc), "price": str(price)}
+    session.modified = True
+
 
 def set_qty(session, kind: str, obj_id: int, qty: int):
-    _normalize(session)
-    qty = max(1, int(qty))
-    for it in session[CART_KEY]:
-        if it.get("kind") == kind and it.get("id") == obj_id:
-            it["qty"] = qty
-            session.modified = True
-            return
+    line = get_item(session, kind, obj_id)
+    if line is not None:
+        line["qty"] = max(1, int(qty))
+        session.modified = True
+
 
 def inc(session, kind: str, obj_id: int):
-    add_item(session, kind, obj_id, price=Decimal(session_price(session, kind, obj_id)), inc=1)
+    line = get_item(session, kind, obj_id)
+    if line is not None:
+        line["qty"] = int(line.get("qty", 1)) + 1
+        session.modified = True
+
 
 def dec(session, kind: str, obj_id: int):
-    _normalize(session)
-    items = session[CART_KEY]
-    for it in list(items):
-        if it.get("kind") == kind and it.get("id") == obj_id:
-            if int(it.get("qty", 1)) > 1:
-                it["qty"] = int(it["qty"]) - 1
-            else:
-                items.remove(it)
-            session.modified = True
-            return
+    lines = _lines(session)
+    key = line_key(kind, obj_id)
+    line = lines.get(key)
+    if line is None:
+        return
+    if int(line.get("qty", 1)) > 1:
+        line["qty"] = int(line["qty"]) - 1
+    else:
+        del lines[key]
+    session.modified = True
+
 
 def remove(session, kind: str, obj_id: int):
-    _normalize(session)
-    items = session[CART_KEY]
-    before = len(items)
-    items[:] = [it for it in items if not (it.get("kind") == kind and it.get("id") == obj_id)]
-    if len(items) != before:
+    if _lines(session).pop(line_key(kind, obj_id), None) is not None:
         session.modified = True
 
+
 def clear(session):
-    session[CART_KEY] = []
+    session[CART_KEY] = {}
     session.modified = True
 
+
 def session_price(session, kind: str, obj_id: int) -> str:
-    _normalize(session)
-    for it in session[CART_KEY]:
-        if it.get("kind") == kind and it.get("id") == obj_id:
-            return it.get("price", "0")
-    return "0"
+    line = get_item(session, kind, obj_id)
+    return line.get("price", "0") if line is not None else "0"
+
 
 def summary(session) -> Tuple[int, int, Decimal]:
-    _normalize(session)
-    items: List[Dict] = session[CART_KEY]
-    lines = len(items)
-    qty = sum(int(it.get("qty", 0)) for it in items)
-    total = sum(Decimal(it.get("price", "0")) * int(it.get("qty", 0)) for it in items)
-    return lines, qty, total
+    lines = _lines(session).values()
+    qty = sum(int(line.get("qty", 0)) for line in lines)
+    total = sum((Decimal(line.get("price", "0")) * int(line.get("qty", 0)) for line in lines),
+                Decimal("0"))
+    return len(lines), qty, total
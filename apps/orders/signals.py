@@ -0,0 +1,34 @@
+import logging
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .cart import merge_session_cart
+from .cart_cache import invalidate_cart_summary
+from .models import Order
+from .reservations import release_order
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=Order)
+def drop_cart_summary(sender, instance, **kwargs):
+    invalidate_cart_summary(instance.user_id)
+
+
+@receiver(pre_delete, sender=Order)
+def release_order_stock(sender, instance, **kwargs):
+    # резерви видаляться каскадом — спершу повертаємо їх у доступний залишок
+    release_order(instance)
+
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, user, request, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        # збій злиття не повинен зривати логін: кошик гостя лишається в сесії
+        try:
+            with transaction.atomic():
+                merge_session_cart(user, request.session)
+        except Exception:
+            logger.exception('Не вдалося перенести кошик гостя користувачу %s', user.pk)
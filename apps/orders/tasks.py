@@ -18,3 +18,16 @@ def export_orders_task():
     except Exception as e:
         logger.error(f'Error exporting orders: {str(e)}')
         raise
+
+
+@shared_task
+def release_expired_reservations_task():
+    """
+    Знімає прострочені резерви залишків (неоплачені замовлення тощо).
+    Запускається кожні 5 хвилин через Celery Beat
+    """
+    from .reservations import release_expired
+    released = release_expired()
+    if released:
+        logger.info(f'Released {released} expired stock reservations')
+    return released
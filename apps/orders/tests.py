@@ -1,3 +1,216 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.products.models import Brand, Category, Main_Categories, Product, Product_Variant
+
+from . import reservations, session_cart
+from .cart import CartError, add_to_cart
+from .models import Order, OrderItem, StockReservation
+
+
+def run_parallel(func, args_list):
+    """func(*args) у окремих потоках одночасно; кожен потік — своє з'єднання з БД."""
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def worker(i, args):
+        try:
+            barrier.wait()
+            results[i] = func(*args)
+        except Exception as exc:
+            results[i] = exc
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i, args)) for i, args in enumerate(args_list)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class StockTestCase(TransactionTestCase):
+    """Товар з одним варіантом (5 шт. на складі) і користувачі з кошиками."""
+
+    def setUp(self):
+        main = Main_Categories.objects.create(name='Коти', slug='koty')
+        category = Category.objects.create(name='Корм', slug='korm', main_category=main)
+        brand = Brand.objects.create(name='Brand', brand_slug='brand')
+        self.product = Product.objects.create(
+            name='Корм', sku='SKU', category=category, brand=brand, retail_price=Decimal('100'),
+        )
+        self.variant = Product_Variant.objects.create(
+            product=self.product, sku='V1', retail_price=Decimal('100'),
+            warehouse_quantity=5, weight=1000,
+        )
+        self.users = []
+
+    def make_order(self, qty=1, status=Order.STATUS_CART, **fields):
+        user = get_user_model().objects.create_user(
+            username=f'u{len(self.users)}', email=f'u{len(self.users)}@example.com', password='pw12345!',
+        )
+        self.users.append(user)
+        order = Order.objects.create(user=user, status=status, **fields)
+        OrderItem.objects.create(order=order, product=self.product, variant=self.variant,
+                                 quantity=qty, retail_price=Decimal('100'))
+        return order
+
+    def reserved(self):
+        self.variant.refresh_from_db()
+        return self.variant.reserved_quantity
+
+
+class CartTests(StockTestCase):
+    """Додавання в кошик: один кошик на користувача, залишок під блокуванням."""
+
+    def test_parallel_first_adds_create_one_cart(self):
+        user = get_user_model().objects.create_user(username='new', password='pw12345!')
+        results = run_parallel(add_to_cart, [(user, self.product, self.variant)] * 6)
+
+        self.assertEqual(sum(isinstance(r, CartError) for r in results), 1, results)
+        self.assertTrue(all(isinstance(r, (tuple, CartError)) for r in results), results)
+        cart = Order.objects.get(user=user, status=Order.STATUS_CART)
+        self.assertEqual(cart.items.get().quantity, 5)
+
+    def test_stock_is_read_under_lock(self):
+        user = self.make_order().user
+        stale = Product_Variant.objects.get(pk=self.variant.pk)
+        Product_Variant.objects.filter(pk=self.variant.pk).update(warehouse_quantity=1)
+
+        with self.assertRaises(CartError):
+            add_to_cart(user, self.product, stale)
+        self.assertEqual(OrderItem.objects.get(order__user=user).quantity, 1)
+
+
+class ReservationTests(StockTestCase):
+    """Резервування під паралельними оформленнями, зняття, списання після синхронізації."""
+
+    def test_parallel_reserve_never_oversells(self):
+        orders = [self.make_order() for _ in range(8)]
+        results = run_parallel(reservations.reserve_order, [(o,) for o in orders])
+
+        self.assertEqual(sum(r is None for r in results), 5)
+        self.assertTrue(all(isinstance(r, reservations.StockError) for r in results if r is not None))
+        self.assertEqual(self.reserved(), 5)
+        self.assertEqual(StockReservation.objects.filter(status=StockReservation.STATUS_ACTIVE).count(), 5)
+
+    def test_parallel_double_checkout_reserves_once(self):
+        order = self.make_order(qty=2)
+        clients = [Client(), Client()]
+        for client in clients:
+            client.force_login(order.user)
+        data = {
+            'full_name': 'Тест', 'phone': '+380501112233', 'email': 'u@example.com', 'city': 'Київ',
+            'delivery_type': 'nova_poshta', 'delivery_address': 'Відділення 1', 'payment_method': 'cash',
+        }
+        results = run_parallel(lambda c: c.post(reverse('orders:checkout'), data), [(c,) for c in clients])
+
+        self.assertTrue(all(not isinstance(r, Exception) for r in results), results)
+        self.assertEqual(StockReservation.objects.filter(order=order).count(), 1)
+        self.assertEqual(self.reserved(), 2)
+
+    def test_release_order_returns_stock(self):
+        order = self.make_order(qty=3)
+        reservations.reserve_order(order)
+        self.assertEqual(reservations.release_order(order), 1)
+        self.assertEqual(reservations.release_order(order), 0)
+        self.assertEqual(self.reserved(), 0)
+
+    def test_reconcile_commits_exported_and_releases_canceled(self):
+        exported = self.make_order(qty=2, exported=True,
+                                   exported_at=timezone.now() - timedelta(hours=1))
+        canceled = self.make_order(qty=1)
+        fresh = self.make_order(qty=1, exported=True, exported_at=timezone.now())
+        for order in (exported, canceled, fresh):
+            reservations.reserve_order(order)
+        Order.objects.filter(pk=canceled.pk).update(status=Order.STATUS_CANCELED)
+
+        self.assertEqual(reservations.reconcile_reservations(), (1, 1))
+        # експортоване щойно — ще не в файлі залишків, резерв лишається
+        self.assertEqual(self.reserved(), 1)
+        self.assertEqual(StockReservation.objects.get(order=exported).status,
+                         StockReservation.STATUS_COMMITTED)
+
+    def test_late_payment_reserves_again(self):
+        order = self.make_order(qty=2)
+        reservations.reserve_order(order, ttl=reservations.PAYMENT_TTL)
+        reservations.release_expired(timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.reserved(), 0)
+
+        self.assertTrue(reservations.confirm_order(order))
+        self.assertEqual(self.reserved(), 2)
+        # повторне підтвердження (callback після success) не дублює резерв
+        self.assertTrue(reservations.confirm_order(order))
+        self.assertEqual(self.reserved(), 2)
+
+    def test_late_payment_without_stock_is_flagged(self):
+        order = self.make_order(qty=2)
+        reservations.reserve_order(order, ttl=reservations.PAYMENT_TTL)
+        reservations.release_expired(timezone.now() + timedelta(hours=1))
+        reservations.reserve_order(self.make_order(qty=4))
+
+        self.assertFalse(reservations.confirm_order(order))
+        order.refresh_from_db()
+        self.assertTrue(order.stock_shortage)
+        self.assertEqual(self.reserved(), 4)
+
+
+class FakeSession(dict):
+    modified = False
+
+
+class SessionCartTests(SimpleTestCase):
+    """Кошик гостя: конвертація старого списку і адресація позицій через sid."""
+
+    def test_legacy_list_is_converted_and_duplicates_merged(self):
+        session = FakeSession(cart=[
+            {'kind': 'variant', 'id': 7, 'qty': 2, 'price': '100.00'},
+            {'kind': 'product', 'id': 7, 'qty': 1, 'price': '55'},
+            {'kind': 'variant', 'id': '7', 'qty': '3', 'price': '100.00'},
+            {'kind': 'bundle', 'id': 1},
+            {'kind': 'variant', 'id': 'x'},
+            'junk',
+        ])
+        lines = list(session_cart.items(session))
+
+        self.assertEqual(
+            [(it.kind, it.id, it.qty, it.price) for it in lines],
+            [('variant', 7, 5, Decimal('100.00')), ('product', 7, 1, Decimal('55'))],
+        )
+        self.assertEqual(session['cart'], {'v:7': {'qty': 5, 'price': '100.00'},
+                                           'p:7': {'qty': 1, 'price': '55'}})
+        self.assertTrue(session.modified)
+        self.assertEqual(session_cart.summary(session), (2, 6, Decimal('555.00')))
+
+    def test_reading_without_cart_does_not_create_it(self):
+        session = FakeSession()
+        self.assertEqual(list(session_cart.items(session)), [])
+        self.assertNotIn('cart', session)
+        self.assertFalse(session.modified)
+
+    def test_sid_round_trip(self):
+        for kind in ('variant', 'product'):
+            for obj_id in (0, 1, 7, 10 ** 9):
+                sid = session_cart.line_sid(kind, obj_id)
+                self.assertEqual(session_cart.parse_sid(sid), (kind, obj_id))
+        self.assertEqual(session_cart.line_sid('variant', 7), 14)
+        self.assertEqual(session_cart.line_sid('product', 7), 15)
+        self.assertEqual(session_cart.parse_sid('15'), ('product', 7))
+
+    def test_item_sid_addresses_its_line(self):
+        session = FakeSession()
+        session_cart.add_item(session, 'product', 3, price=Decimal('10'), inc=2)
+        session_cart.add_item(session, 'variant', 3, price=Decimal('20'))
+        for item in session_cart.items(session):
+            kind, obj_id = session_cart.parse_sid(item.sid)
+            session_cart.inc(session, kind, obj_id)
+        self.assertEqual(session['cart'], {'p:3': {'qty': 3, 'price': '10'},
+                                           'v:3': {'qty': 2, 'price': '20'}})
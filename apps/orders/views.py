@@ -11,38 +11,22 @@ import hmac
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import F, Sum, DecimalField, ExpressionWrapper
 from django.conf import settings
+from django.db import transaction
 
 from .models import Order, OrderItem
 from .forms import OrderCheckoutForm
 from apps.products.models import Product, Product_Variant
 
-from .session_cart import summary as sess_summary, add_item as sess_add, CART_KEY
+from Laskazoo.throttle import limited_response, throttle
 
-
-def ensure_clean_cart(user):
-    """
-    Гарантує чистий кошик для користувача
-    Видаляє всі кошикові замовлення з заповненими даними
-    """
-    # Шукаємо кошикові замовлення з заповненими контактами
-    problematic_carts = Order.objects.filter(
-        user=user,
-        status=Order.STATUS_CART
-    ).exclude(
-        full_name='',
-        phone='',
-        email=''
-    )
-    
-    if problematic_carts.exists():
-        print(f"ВИПРАВЛЕННЯ: знайдено {problematic_carts.count()} проблемних кошиків")
-        for cart in problematic_carts:
-            print(f"   Видаляємо кошик #{cart.id} з контактами: {cart.full_name}")
-            cart.delete()
-    
-    return True
+from . import cart as cart_service
+from .aggregates import refresh_order_totals
+from .cart_cache import cart_summary_for, refresh_cart_summary
+from .loaders import load_cart, with_items
+from .reservations import CONFIRMED_TTL, PAYMENT_TTL, StockError, reserve_order
+from . import session_cart
+from .session_cart import summary as sess_summary, add_item as sess_add
 
 
 def _is_ajax(request):
@@ -52,39 +36,24 @@ def _is_ajax(request):
         or request.GET.get('ajax') == '1'
     )
 
+def _cart_limited(request):
+    if _is_ajax(request):
+        return limited_response(request)
+    return redirect('orders:cart')
+
 def _get_cart(user):
     return Order.objects.filter(user=user, status=Order.STATUS_CART).first()
 
 def _cart_tuple(user):
-    order = Order.objects.filter(user=user, status=Order.STATUS_CART).first()
-    total = Decimal('0')
-    if order:
-        line_total = ExpressionWrapper(
-            F('quantity') * F('retail_price'),
-            output_field=DecimalField(max_digits=12, decimal_places=2)
-        )
-        total = order.items.aggregate(total=Sum(line_total))['total'] or Decimal('0')
+    order = load_cart(user)
+    total = order.total_amount if order else Decimal('0')
     return order, total
 
 def _cart_math(user):
-    order = Order.objects.filter(user=user, status=Order.STATUS_CART).first()
-    if not order:
-        return 0, 0, Decimal('0')
-    qty = order.items.aggregate(q=Sum('quantity'))['q'] or 0
-    line_total = ExpressionWrapper(
-        F('quantity') * F('retail_price'),
-        output_field=DecimalField(max_digits=12, decimal_places=2)
-    )
-    total = order.items.aggregate(t=Sum(line_total))['t'] or Decimal('0')
-    count = order.items.count()
-    return count, qty, total
+    return cart_summary_for(user.pk)
 
 def _cart_numbers(user):
-    order = Order.objects.filter(user=user, status=Order.STATUS_CART).first()
-    if not order:
-        return 0, 0
-    lines = order.items.count()
-    qty = order.items.aggregate(q=Sum('quantity'))['q'] or 0
+    lines, qty, _ = cart_summary_for(user.pk)
     return lines, qty
 
 
@@ -106,22 +75,24 @@ def cart_modal(request):
         order, total = _cart_tuple(request.user)
         return render(request, 'zoosvit/orders/_cart_modal_body.html', {'order': order, 'total': total})
 
-    items: List[Dict] = request.session.get(CART_KEY, []) or []
+    lines = list(session_cart.items(request.session))
+    variant_ids = [it.id for it in lines if it.kind == 'variant']
+    product_ids = [it.id for it in lines if it.kind == 'product']
+    variants = Product_Variant.objects.select_related('product').in_bulk(variant_ids) \
+        if variant_ids else {}
+    products = Product.objects.in_bulk(product_ids) if product_ids else {}
+
     sitems: List[Dict] = []
     total = Decimal('0')
 
-    for idx, it in enumerate(items):
-        kind = it.get('kind')
-        obj_id = int(it.get('id'))
-        qty = int(it.get('qty', 1))
-        price = Decimal(str(it.get('price', '0')))
-        line = qty * price
+    for it in lines:
+        line = it.qty * it.price
 
         name = sku = weight = size = ''
         thumb_url = None
 
-        if kind == 'variant':
-            v = Product_Variant.objects.select_related('product').filter(pk=obj_id).first()
+        if it.kind == 'variant':
+            v = variants.get(it.id)
             if v:
                 name = v.product.name
                 sku = v.sku or ''
@@ -130,19 +101,19 @@ def cart_modal(request):
                 thumb_url = (getattr(v, 'image', None) and v.image.url) \
                             or (getattr(v.product, 'image', None) and v.product.image.url)
         else:
-            p = Product.objects.filter(pk=obj_id).first()
+            p = products.get(it.id)
             if p:
                 name = p.name
                 thumb_url = getattr(p, 'image', None) and p.image.url
 
         total += line
         sitems.append({
-            'sid': idx,
+            'sid': it.sid,
             'name': name,
             'sku': sku,
             'weight': weight,
             'size': size,
-            'qty': qty,
+            'qty': it.qty,
             'line': line,
             'thumb': thumb_url,
         })
@@ -150,89 +121,33 @@ def cart_modal(request):
     return render(request, 'zoosvit/orders/_cart_modal_body.html', {'sitems': sitems, 'total': total})
 
 
+@throttle('cart_add', rate=(10, 10), dedup=2, on_limited=_cart_limited)
 def add_variant_to_cart(request, variant_id: int):
-    # КРИТИЧНЕ ВИПРАВЛЕННЯ: захист від одночасних запитів
-    import time
-    user_key = request.user.id if request.user.is_authenticated else request.session.session_key or 'anonymous'
-    request_key = f'add_variant_{variant_id}_{user_key}'
-    current_time = time.time()
-    
-    # Перевіряємо кеш запитів (використовуємо сесію для простоти)
-    last_request_key = f'last_add_request_{request_key}'
-    if last_request_key in request.session:
-        last_time = float(request.session[last_request_key])
-        time_diff = current_time - last_time
-        if time_diff < 2.0:  # менше 2 секунд між запитами
-            print(f"ЗАХИСТ PYTHON: Подвійний запит додавання варіанту {variant_id} (різниця: {time_diff:.2f}с) - ігноруємо")
-            if _is_ajax(request):
-                return JsonResponse({'ok': False, 'message': 'Дуже швидко! Почекайте'}, status=429)
-            return redirect('orders:cart')
-    
-    # Зберігаємо час поточного запиту
-    request.session[last_request_key] = current_time
-    request.session.modified = True
-    
-    variant = get_object_or_404(Product_Variant, pk=variant_id)
+    return _add_variant(request, variant_id)
 
-    if variant.warehouse_quantity is not None and variant.warehouse_quantity <= 0:
-        if _is_ajax(request):
-            return JsonResponse({'ok': False, 'message': 'Немає в наявності'}, status=400)
-        messages.warning(request, 'Немає в наявності.')
-        return redirect('orders:cart')
+
+def _not_added(request, message):
+    if _is_ajax(request):
+        return JsonResponse({'ok': False, 'message': message}, status=400)
+    messages.warning(request, f'{message}.')
+    return redirect('orders:cart')
+
+
+def _add_variant(request, variant_id):
+    variant = get_object_or_404(Product_Variant.objects.select_related('product'), pk=variant_id)
+
+    if variant.available_quantity <= 0:
+        return _not_added(request, 'Немає в наявності')
 
     if request.user.is_authenticated:
-        # КРИТИЧНЕ ВИПРАВЛЕННЯ: спочатку очищаємо проблемні кошики
-        ensure_clean_cart(request.user)
-        
-        # Тепер створюємо або знаходимо чистий кошик
-        order, created = Order.objects.get_or_create(
-            user=request.user, 
-            status=Order.STATUS_CART,
-            defaults={
-                'status': Order.STATUS_CART,
-                'full_name': '',
-                'phone': '',
-                'email': '',
-                'delivery_condition': '',  # ПОРОЖНІ ПОЛЯ!
-                'delivery_address': '',
-                'comment': ''
-            }
-        )
-        
-        # Подвійна перевірка (мало ли що)
-        if not created and (order.full_name or order.phone or order.email):
-            print(f"КРИТИЧНА ПОМИЛКА: Кошик #{order.id} все ще має дані!")
-            order.delete()  # Видаляємо його повністю
-            # Створюємо новий чистий кошик
-            order = Order.objects.create(
-                user=request.user,
-                status=Order.STATUS_CART,
-                full_name='',
-                phone='',
-                email='',
-                delivery_condition='',  # ПОРОЖНІ ПОЛЯ!
-                delivery_address='',
-                comment=''
+        try:
+            count, qty, total = cart_service.add_to_cart(
+                request.user, variant.product, variant
             )
-            print(f"   Створено новий чистий кошик #{order.id}")
-            
-        item, _ = OrderItem.objects.get_or_create(
-            order=order, product=variant.product, variant=variant,
-            defaults={'retail_price': variant.retail_price, 'quantity': 0}
-        )
-        new_qty = item.quantity + 1
-        if variant.warehouse_quantity is not None and new_qty > variant.warehouse_quantity:
-            if _is_ajax(request):
-                return JsonResponse({'ok': False, 'message': f'Доступно лише {variant.warehouse_quantity} шт.'}, status=400)
-            messages.warning(request, f'Доступно лише {variant.warehouse_quantity} шт.')
-            return redirect('orders:cart')
-
-        item.quantity = new_qty
-        item.retail_price = variant.retail_price
-        item.save(update_fields=['quantity', 'retail_price'])
+        except cart_service.CartError as exc:
+            return _not_added(request, str(exc))
 
         if _is_ajax(request):
-            count, qty, total = _cart_math(request.user)
             return JsonResponse({'ok': True, 'count': count, 'qty': qty, 'total': str(total)}, status=201)
         messages.success(request, f'Додано: {variant.product.name}')
         return redirect('orders:cart')
@@ -243,31 +158,11 @@ def add_variant_to_cart(request, variant_id: int):
         return JsonResponse({'ok': True, 'count': lines, 'qty': qty, 'total': str(total)}, status=201)
     return redirect('orders:cart')
 
+@throttle('cart_add', rate=(10, 10), dedup=2, on_limited=_cart_limited)
 def add_to_cart(request, product_id: int):
     variant_id = request.GET.get('variant')
     if variant_id:
-        return add_variant_to_cart(request, variant_id)
-    
-    # КРИТИЧНЕ ВИПРАВЛЕННЯ: захист від одночасних запитів
-    import time
-    user_key = request.user.id if request.user.is_authenticated else request.session.session_key or 'anonymous'
-    request_key = f'add_product_{product_id}_{user_key}'
-    current_time = time.time()
-    
-    # Перевіряємо кеш запитів
-    last_request_key = f'last_add_request_{request_key}'
-    if last_request_key in request.session:
-        last_time = float(request.session[last_request_key])
-        time_diff = current_time - last_time
-        if time_diff < 2.0:  # менше 2 секунд між запитами
-            print(f"ЗАХИСТ PYTHON: Подвійний запит додавання продукту {product_id} (різниця: {time_diff:.2f}с) - ігноруємо")
-            if _is_ajax(request):
-                return JsonResponse({'ok': False, 'message': 'Дуже швидко! Почекайте'}, status=429)
-            return redirect('orders:cart')
-    
-    # Зберігаємо час поточного запиту
-    request.session[last_request_key] = current_time
-    request.session.modified = True
+        return _add_variant(request, variant_id)
 
     product = get_object_or_404(Product, pk=product_id)
 
@@ -277,54 +172,19 @@ def add_to_cart(request, product_id: int):
          .filter(warehouse_quantity__gt=0).first()
          or Product_Variant.objects.filter(product=product).order_by('retail_price').first())
     if v:
-        return add_variant_to_cart(request, v.id)
+        return _add_variant(request, v.id)
+
+    # товар без варіантів резервується з Product.warehouse_quantity (reserve_order)
+    if product.available_quantity <= 0:
+        return _not_added(request, 'Немає в наявності')
 
     if request.user.is_authenticated:
-        # КРИТИЧНЕ ВИПРАВЛЕННЯ: спочатку очищаємо проблемні кошики
-        ensure_clean_cart(request.user)
-        
-        # Тепер створюємо або знаходимо чистий кошик
-        order, created = Order.objects.get_or_create(
-            user=request.user, 
-            status=Order.STATUS_CART,
-            defaults={
-                'status': Order.STATUS_CART,
-                'full_name': '',
-                'phone': '',
-                'email': '',
-                'delivery_condition': '',  # ПОРОЖНІ ПОЛЯ!
-                'delivery_address': '',
-                'comment': ''
-            }
-        )
-        
-        # Подвійна перевірка
-        if not created and (order.full_name or order.phone or order.email):
-            print(f"КРИТИЧНА ПОМИЛКА: Кошик #{order.id} все ще має дані!")
-            order.delete()
-            order = Order.objects.create(
-                user=request.user,
-                status=Order.STATUS_CART,
-                full_name='',
-                phone='',
-                email='',
-                delivery_condition='',  # ПОРОЖНІ ПОЛЯ!
-                delivery_address='',
-                comment=''
-            )
-            print(f"   Створено новий чистий кошик #{order.id}")
-            
-        item, _ = OrderItem.objects.get_or_create(
-            order=order, product=product, variant=None,
-            defaults={'retail_price': product.retail_price, 'quantity': 0}
-        )
-        item.quantity += 1
-        if product.retail_price is not None:
-            item.retail_price = product.retail_price
-        item.save(update_fields=['quantity', 'retail_price'])
+        try:
+            count, qty, total = cart_service.add_to_cart(request.user, product)
+        except cart_service.CartError as exc:
+            return _not_added(request, str(exc))
 
         if _is_ajax(request):
-            count, qty, total = _cart_math(request.user)
             return JsonResponse({'ok': True, 'count': count, 'qty': qty, 'total': str(total)}, status=201)
         messages.success(request, f'Додано: {product.name}')
         return redirect('orders:cart')
@@ -347,13 +207,16 @@ def item_set_qty(request, item_id):
         qty = int(request.POST.get('qty', '1'))
     except ValueError:
         qty = 1
+    # не більше доступного (склад − резерви), як і при додаванні в кошик
+    available = cart_service.available_stock(item.product, item.variant)
+    if available is not None:
+        qty = min(qty, available)
     if qty < 1:
         qty = 1
-    if item.variant and item.variant.warehouse_quantity is not None:
-        qty = min(qty, int(item.variant.warehouse_quantity))
 
     item.quantity = qty
     item.save(update_fields=['quantity'])
+    refresh_cart_summary(request.user.pk)
     return cart_modal(request)
 
 @login_required
@@ -371,7 +234,7 @@ def cart_detail(request):
 @login_required
 def checkout(request):
     # ВАЖЛИВО: шукаємо ТІЛЬКИ кошикові замовлення
-    order = get_object_or_404(Order, user=request.user, status=Order.STATUS_CART)
+    order = get_object_or_404(with_items(Order.objects), user=request.user, status=Order.STATUS_CART)
     
     # Перевіряємо, чи є товари в кошику
     if not order.items.exists():
@@ -456,7 +319,22 @@ def checkout(request):
             
             # Встановлюємо статус "в обробці" (in_process) - буде експортовано в JSON
             order.status = Order.STATUS_IN_PROCESS
-            order.save()
+            ttl = PAYMENT_TTL if payment_method == 'card_online' else CONFIRMED_TTL
+            try:
+                with transaction.atomic():
+                    # повторна відправка форми чекає тут на блокуванні і бачить,
+                    # що замовлення вже оформлене — резерв не дублюється
+                    still_cart = list(Order.objects.select_for_update()
+                                      .filter(pk=order.pk, status=Order.STATUS_CART)
+                                      .values_list('pk'))
+                    if not still_cart:
+                        return redirect('orders:list')
+                    reserve_order(order, ttl=ttl)
+                    order.save()
+            except StockError as exc:
+                messages.error(request, str(exc))
+                return redirect('orders:cart')
+            refresh_order_totals([order.pk])
             
             # Генеруємо номер замовлення
             order_number = order.order_number or order.id
@@ -503,87 +381,40 @@ def checkout(request):
 
 @login_required
 def orders_list(request):
-    qs = Order.objects.filter(user=request.user).exclude(status=Order.STATUS_CART)
+    qs = with_items(Order.objects.filter(user=request.user).exclude(status=Order.STATUS_CART))
     return render(request, 'orders/history.html', {'orders': qs})
 
 @login_required
 def order_list(request):
-    orders = request.user.orders.all()
+    orders = with_items(request.user.orders.all())
     return render(request, 'zoosvit/orders/order_list.html', {'orders': orders})
 
 @login_required
 def order_detail(request, pk):
-    order = get_object_or_404(Order, pk=pk, user=request.user)
+    order = get_object_or_404(with_items(Order.objects), pk=pk, user=request.user)
     return render(request, 'zoosvit/orders/order_detail.html', {'order': order})
 
 
-def _sess_get_items(request):
-    return list(request.session.get(CART_KEY, []) or [])
-
-def _sess_save_items(request, items):
-    request.session[CART_KEY] = items
-    request.session.modified = True
-
+@throttle('cart_qty', rate=(20, 10), dedup=1, on_limited=_cart_limited)
 def cart_item_inc(request, item_id: int):
-    # ПОКРАЩЕНИЙ ЗАХИСТ ВІД ПОДВІЙНИХ КЛІКІВ
-    session_key = f'cart_inc_{item_id}_{request.user.id if request.user.is_authenticated else "guest"}'
-    import time
-    current_time = time.time()
-    
-    # Перевіряємо чи був клік недавно
-    if session_key in request.session:
-        last_click = float(request.session[session_key])
-        time_diff = current_time - last_click
-        if time_diff < 2:  # ЗБІЛЬШУЄМО ЧАС ДО 2 СЕКУНД!
-            print(f"ЗАХИСТ: Подвійний клік на товар {item_id} (різниця: {time_diff:.2f}с) - ігноруємо")
-            if _is_ajax(request):
-                return JsonResponse({'ok': False, 'message': 'Дуже швидко! Почекайте'}, status=429)
-            return cart_modal(request) if _is_ajax(request) else redirect('orders:cart')
-    
-    # Зберігаємо час кліка
-    request.session[session_key] = current_time
-    request.session.modified = True
-    
     print(f"ДОДАЄМО ТОВАР: item_id={item_id}, user={request.user.username if request.user.is_authenticated else 'guest'}")
     if request.user.is_authenticated and not request.GET.get('guest'):
         item = get_object_or_404(
             OrderItem, id=item_id,
             order__user=request.user, order__status=Order.STATUS_CART
         )
-        if item.variant and item.variant.warehouse_quantity is not None \
-           and item.quantity + 1 > item.variant.warehouse_quantity:
+        if item.variant and item.quantity + 1 > item.variant.available_quantity:
             return JsonResponse({'ok': False, 'message': 'Перевищено доступний склад'}, status=400) if _is_ajax(request) \
                    else redirect('orders:cart')
         item.quantity += 1
         item.save(update_fields=['quantity'])
+        refresh_cart_summary(request.user.pk)
     else:
-        sid = int(item_id)
-        items = _sess_get_items(request)
-        if 0 <= sid < len(items):
-            items[sid]['qty'] = int(items[sid].get('qty', 1)) + 1
-            _sess_save_items(request, items)
+        session_cart.inc(request.session, *session_cart.parse_sid(item_id))
     return cart_modal(request) if _is_ajax(request) else redirect('orders:cart')
 
+@throttle('cart_qty', rate=(20, 10), dedup=1, on_limited=_cart_limited)
 def cart_item_dec(request, item_id: int):
-    # ПОКРАЩЕНИЙ ЗАХИСТ ВІД ПОДВІЙНИХ КЛІКІВ
-    session_key = f'cart_dec_{item_id}_{request.user.id if request.user.is_authenticated else "guest"}'
-    import time
-    current_time = time.time()
-    
-    # Перевіряємо чи був клік недавно
-    if session_key in request.session:
-        last_click = float(request.session[session_key])
-        time_diff = current_time - last_click
-        if time_diff < 2:  # ЗБІЛЬШУЄМО ЧАС ДО 2 СЕКУНД!
-            print(f"ЗАХИСТ: Подвійний клік на товар {item_id} (різниця: {time_diff:.2f}с) - ігноруємо")
-            if _is_ajax(request):
-                return JsonResponse({'ok': False, 'message': 'Дуже швидко! Почекайте'}, status=429)
-            return cart_modal(request) if _is_ajax(request) else redirect('orders:cart')
-    
-    # Зберігаємо час кліка
-    request.session[session_key] = current_time
-    request.session.modified = True
-    
     print(f"ВІДНІМАЄМО ТОВАР: item_id={item_id}, user={request.user.username if request.user.is_authenticated else 'guest'}")
     if request.user.is_authenticated and not request.GET.get('guest'):
         item = get_object_or_404(
@@ -595,16 +426,9 @@ def cart_item_dec(request, item_id: int):
             item.save(update_fields=['quantity'])
         else:
             item.delete()
+        refresh_cart_summary(request.user.pk)
     else:
-        sid = int(item_id)
-        items = _sess_get_items(request)
-        if 0 <= sid < len(items):
-            q = int(items[sid].get('qty', 1)) - 1
-            if q <= 0:
-                items.pop(sid)
-            else:
-                items[sid]['qty'] = q
-            _sess_save_items(request, items)
+        session_cart.dec(request.session, *session_cart.parse_sid(item_id))
     return cart_modal(request) if _is_ajax(request) else redirect('orders:cart')
 
 def cart_item_remove(request, item_id: int):
@@ -614,12 +438,9 @@ def cart_item_remove(request, item_id: int):
             order__user=request.user, order__status=Order.STATUS_CART
         )
         item.delete()
+        refresh_cart_summary(request.user.pk)
     else:
-        sid = int(item_id)
-        items = _sess_get_items(request)
-        if 0 <= sid < len(items):
-            items.pop(sid)
-            _sess_save_items(request, items)
+        session_cart.remove(request.session, *session_cart.parse_sid(item_id))
     return cart_modal(request) if _is_ajax(request) else redirect('orders:cart')
 
 def cart_clear(request):
@@ -636,19 +457,20 @@ def cart_clear(request):
                         order.delete()  # Видаляємо все замовлення!
                     else:
                         print("Кошик вже порожній")
+                    refresh_cart_summary(user.pk)
                 else:
                     print("Користувач не авторизований")
             except Exception as db_error:
                 print(f"Помилка бази даних при очищенні кошика: {db_error}")
                 # Якщо помилка з базою даних - очищаємо сесію
-                _sess_save_items(request, [])
+                session_cart.clear(request.session)
         else:
-            _sess_save_items(request, [])
+            session_cart.clear(request.session)
     except Exception as e:
         print(f"Критична помилка при очищенні кошика: {e}")
         # У випадку будь-якої помилки - намагаємося очистити сесію
         try:
-            _sess_save_items(request, [])
+            session_cart.clear(request.session)
         except:
             pass
     
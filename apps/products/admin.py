@@ -1,5 +1,9 @@
 from django.contrib import admin
 from .models import Main_Categories, Category, Brand, Product, PopularProduct
+from .aggregates import refresh_product_aggregates
+from .caching import bump_catalog_version
+from .facets import refresh_brand_facets
+from .search import refresh_search_index
 
 @admin.register(Main_Categories)
 class MainCategoriesAdmin(admin.ModelAdmin):
@@ -10,7 +14,29 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name','slug','main_category')
 
 admin.site.register(Brand)
-admin.site.register(Product)
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+
+    def save_related(self, request, form, formsets, change):
+        # після інлайнів: ціна/наявність і пошуковий індекс мають бачити всі варіанти
+        super().save_related(request, form, formsets, change)
+        refresh_product_aggregates([form.instance.pk])
+        # товар міг переїхати в іншу категорію — рахуємо і стару
+        refresh_brand_facets({form.instance.category_id, form.initial.get('category')})
+        refresh_search_index([form.instance.pk])
+        bump_catalog_version()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_brand_facets([obj.category_id])
+        bump_catalog_version()
+
+    def delete_queryset(self, request, queryset):
+        category_ids = set(queryset.values_list('category_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_brand_facets(category_ids)
+        bump_catalog_version()
 
 # @admin.register(PopularProduct)
 # class PopularProductAdmin(admin.ModelAdmin):
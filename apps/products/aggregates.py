@@ -0,0 +1,59 @@
+"""
+Денормалізовані ціна та наявність товару.
+
+Product.min_variant_price — мінімальна ціна серед варіантів,
+Product.price_eff         — min_variant_price або власна retail_price,
+Product.has_stock         — є залишок у товару або хоча б в одному варіанті.
+
+Лістинги фільтрують і сортують по цих колонках напряму (індексний range scan),
+без JOIN на варіанти, GROUP BY та DISTINCT.
+"""
+from django.db.models import (
+    Case, DecimalField, Exists, F, Min, OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from .models import Product, Product_Variant
+
+AGGREGATE_BATCH_SIZE = 1000
+
+
+def _aggregates_update():
+    min_price = Subquery(
+        Product_Variant.objects
+        .filter(product_id=OuterRef('pk'))
+        .order_by()
+        .values('product_id')
+        .annotate(m=Min('retail_price'))
+        .values('m')[:1],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    variant_in_stock = Exists(
+        Product_Variant.objects.filter(product_id=OuterRef('pk'), warehouse_quantity__gt=0)
+    )
+    return {
+        'min_variant_price': min_price,
+        'price_eff': Coalesce(min_price, F('retail_price')),
+        'has_stock': Case(
+            When(Q(warehouse_quantity__gt=0) | variant_in_stock, then=Value(True)),
+            default=Value(False),
+        ),
+    }
+
+
+def refresh_product_aggregates(product_ids=None, batch_size=AGGREGATE_BATCH_SIZE):
+    """
+    Перераховує min_variant_price / price_eff / has_stock одним UPDATE
+    на пачку товарів (або на весь каталог, якщо product_ids is None).
+    Повертає кількість оновлених рядків.
+    """
+    if product_ids is None:
+        return Product.objects.update(**_aggregates_update())
+
+    ids = sorted({int(pid) for pid in product_ids if pid})
+    total = 0
+    for i in range(0, len(ids), batch_size):
+        total += (Product.objects
+                  .filter(id__in=ids[i:i + batch_size])
+                  .update(**_aggregates_update()))
+    return total
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.products'
+
+    def ready(self):
+        from . import signals
+        # товари, що з'явились до індексу (або повз сигнали), — після кожного migrate
+        post_migrate.connect(signals.index_missing_after_migrate, sender=self)
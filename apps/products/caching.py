@@ -0,0 +1,84 @@
+"""
+Версія каталогу та процесний LRU-кеш.
+
+catalog_version() лежить у Django-кеші (Redis, спільний для
+веб-воркерів і manage.py-команд). sync_ts_direct та кабінет менеджера
+викликають bump_catalog_version(), коли змінюються назви/ціни/наявність,
+і всі кеші, що мають версію в ключі, автоматично стають неактуальними.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'products:catalog_version'
+# як часто процес перечитує версію з кешу (сек.)
+VERSION_CHECK_INTERVAL = 1.0
+
+_version_memo = {'value': None, 'checked_at': 0.0}
+
+
+def catalog_version():
+    now = time.monotonic()
+    if _version_memo['value'] is not None and now - _version_memo['checked_at'] < VERSION_CHECK_INTERVAL:
+        return _version_memo['value']
+
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+
+    _version_memo['value'] = version
+    _version_memo['checked_at'] = now
+    return version
+
+
+def bump_catalog_version():
+    try:
+        version = cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:  # ключа ще немає
+        version = 2
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    _version_memo['value'] = version
+    _version_memo['checked_at'] = time.monotonic()
+    return version
+
+
+class LRUCache:
+    """
+    Обмежений за розміром кеш у пам'яті процесу з витісненням LRU
+    та TTL як запобіжником, якщо bump версії не дійде (CACHE_URL=locmem://).
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
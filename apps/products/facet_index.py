@@ -0,0 +1,300 @@
+"""
+Бітсетовий індекс фасетів у пам'яті процесу.
+
+Кожному товару відповідає позиція (біт) у відсортованому списку id.
+Для кожного значення атрибута (категорія, бренд, розмір, вага, колір,
+наявність) зберігається бітова маска товарів — звичайний Python int.
+Будь-яка комбінація фільтрів — це AND/OR масок, а результат
+перетворюється на умову для SQL (FacetIndex.q): діапазони id або,
+якщо маска надто "рвана", один масив-параметр замість списку pk__in.
+
+Розмір/вага/колір беруться з товару та всіх його варіантів:
+товар потрапляє у фасет, якщо хоча б один варіант має це значення.
+
+Знімок будується лише поза запитами: warm_facet_index() після sync_ts_direct,
+Celery beat кожні 5 хвилин і команда warm_facet_index при деплої кладуть
+його в спільний кеш, воркери лише завантажують готовий (і тримають копію,
+поки в кеші не з'явиться новіший). Поки знімка немає, фільтри атрибутів
+працюють через SQL (attr_q), а групи атрибутів у сайдбарі не показуються.
+
+Наявність у знімок не входить: між перебудовами вона застаріває, тож
+in_stock завжди фільтрується по Product.has_stock у SQL, а для лічильників
+атрибутів маска наявності береться свіжим запитом (stock_mask).
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product, Product_Variant
+
+# GET-параметр -> атрибут індексу
+ATTR_PARAMS = {
+    'size': 'size',
+    'weight': 'weight',
+    'color': 'color',
+}
+ATTR_TITLES = {
+    'size': 'Розмір',
+    'weight': 'Вага',
+    'color': 'Колір',
+}
+
+# знімок у кеші живе дві перебудови beat: якщо beat зупинився — SQL-шлях
+FACET_INDEX_MAX_AGE = 60 * 10
+FACET_INDEX_CACHE_KEY = 'products:facet_index'
+# built_at опублікованого знімка: дешева перевірка без читання самого індексу
+FACET_INDEX_STAMP_KEY = 'products:facet_index:built_at'
+# більше діапазонів id — маска йде в SQL одним масивом
+MAX_RANGE_TERMS = 50
+
+_lock = threading.Lock()
+_snapshot = {'index': None}
+
+
+def _clean(value):
+    return str(value).strip() if value not in (None, '', 0) else ''
+
+
+def weight_label(grams):
+    g = int(grams)
+    return f"{g}g" if g < 1000 or g % 1000 != 0 else f"{g // 1000}kg"
+
+
+class FacetIndex:
+
+    def __init__(self, ids):
+        self.ids = ids  # відсортовані id товарів; позиція = номер біта
+        self.built_at = time.time()
+        self.all = (1 << len(ids)) - 1
+        self.bits = {
+            'category': {},
+            'brand': {},
+            'size': {},
+            'weight': {},
+            'color': {},
+        }
+
+    def _add(self, attr, value, bit):
+        if value:
+            table = self.bits[attr]
+            table[value] = table.get(value, 0) | bit
+
+    def bit(self, product_id):
+        pos = bisect_left(self.ids, product_id)
+        if pos < len(self.ids) and self.ids[pos] == product_id:
+            return 1 << pos
+        return 0
+
+    @classmethod
+    def build(cls):
+        products = list(
+            Product.objects.order_by('id')
+            .values_list('id', 'category_id', 'brand__brand_slug', 'size', 'weight', 'color')
+        )
+        index = cls([row[0] for row in products])
+
+        for pos, (pid, category_id, brand_slug, size, weight, color) in enumerate(products):
+            bit = 1 << pos
+            index._add('category', category_id, bit)
+            index._add('brand', brand_slug, bit)
+            index._add('size', _clean(size), bit)
+            index._add('weight', _clean(weight), bit)
+            index._add('color', _clean(color), bit)
+
+        variants = (Product_Variant.objects
+                    .order_by()
+                    .values_list('product_id', 'size', 'weight', 'color'))
+        for pid, size, weight, color in variants.iterator(chunk_size=5000):
+            bit = index.bit(pid)
+            if not bit:
+                continue
+            index._add('size', _clean(size), bit)
+            index._add('weight', _clean(weight), bit)
+            index._add('color', _clean(color), bit)
+        return index
+
+    def any_of(self, attr, values):
+        """OR масок для values; порожній список — без обмеження."""
+        if not values:
+            return self.all
+        table = self.bits[attr]
+        mask = 0
+        for value in values:
+            mask |= table.get(value, 0)
+        return mask
+
+    def mask_of(self, product_ids):
+        """Маска для id товарів (невідомі індексу пропускаються)."""
+        mask = 0
+        for pid in product_ids:
+            mask |= self.bit(pid)
+        return mask
+
+    def match(self, category=None, brands=None, within=None, **attrs):
+        """
+        Маска товарів, що відповідають усім фільтрам.
+        within — додаткова маска (напр. stock_mask), attrs: size=[...], weight=[...], color=[...].
+        """
+        mask = self.all if within is None else within
+        if category is not None:
+            mask &= self.bits['category'].get(category, 0)
+        mask &= self.any_of('brand', brands)
+        for attr, values in attrs.items():
+            mask &= self.any_of(attr, values)
+        return mask
+
+    def product_ids(self, mask):
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(self.ids[low.bit_length() - 1])
+            mask ^= low
+        return ids
+
+    def runs(self, mask, limit=None):
+        """
+        Суцільні відрізки біт маски: [(id першого, id останнього), ...];
+        None, якщо їх більше за limit.
+        """
+        runs = []
+        while mask:
+            if limit is not None and len(runs) >= limit:
+                return None
+            start = (mask & -mask).bit_length() - 1
+            # кількість одиниць поспіль від start
+            length = ((mask >> start) ^ ((mask >> start) + 1)).bit_length() - 1
+            runs.append((self.ids[start], self.ids[start + length - 1]))
+            mask &= ~(((1 << length) - 1) << start)
+        return runs
+
+    def q(self, mask):
+        """
+        Умова pk для маски. id у індексі відсортовані, а нові товари отримують
+        більші id, тож відрізок маски — точний pk__range. Для "рваної" маски
+        (багато відрізків) — один масив-параметр замість тисяч плейсхолдерів
+        pk__in.
+        """
+        if not mask:
+            return Q(pk__in=[])
+        runs = self.runs(mask, limit=MAX_RANGE_TERMS)
+        if runs is not None:
+            cond = Q()
+            for first, last in runs:
+                cond |= Q(pk=first) if first == last else Q(pk__range=(first, last))
+            return cond
+        return Q(pk__in=RawSQL('SELECT unnest(%s::bigint[])', (self.product_ids(mask),)))
+
+    def counts(self, attr, mask):
+        """{значення: кількість товарів у mask}, без нульових."""
+        result = {}
+        for value, bits in self.bits[attr].items():
+            n = (bits & mask).bit_count()
+            if n:
+                result[value] = n
+        return result
+
+
+def warm_facet_index():
+    """Будує знімок і публікує його в спільний кеш для всіх воркерів."""
+    index = FacetIndex.build()
+    cache.set(FACET_INDEX_CACHE_KEY, index, FACET_INDEX_MAX_AGE)
+    cache.set(FACET_INDEX_STAMP_KEY, index.built_at, FACET_INDEX_MAX_AGE)
+    with _lock:
+        _snapshot['index'] = index
+    return index
+
+
+def facet_index():
+    """
+    Опублікований знімок або None (ще не побудований / beat зупинився) —
+    тоді атрибути фільтруються через attr_q. Сам запит індекс не будує.
+    """
+    built_at = cache.get(FACET_INDEX_STAMP_KEY)
+    if built_at is None:
+        return None
+    index = _snapshot['index']
+    if index is not None and index.built_at == built_at:
+        return index
+    shared = cache.get(FACET_INDEX_CACHE_KEY)
+    if shared is not None:
+        with _lock:
+            _snapshot['index'] = shared
+    return shared
+
+
+def stock_mask(index, category=None):
+    """Маска товарів у наявності — свіжим запитом по Product.has_stock."""
+    products = Product.objects.filter(has_stock=True)
+    if category is not None:
+        products = products.filter(category_id=category)
+    return index.mask_of(products.values_list('id', flat=True).iterator(chunk_size=5000))
+
+
+def _sql_values(attr, values):
+    if attr == 'weight':
+        return [int(v) for v in values if v.isdigit() and int(v) > 0]
+    return values
+
+
+def attr_q(attrs):
+    """
+    SQL-умова для розміру / ваги / кольору, поки знімка немає: значення
+    в самого товару або хоча б в одного його варіанта.
+    """
+    cond = Q()
+    for attr, values in attrs.items():
+        values = _sql_values(attr, values)
+        variants = Product_Variant.objects.filter(**{f'{attr}__in': values}).values('product_id')
+        cond &= Q(**{f'{attr}__in': values}) | Q(pk__in=variants)
+    return cond
+
+
+def selected_attrs(request):
+    """{'size': [...], 'weight': [...], 'color': [...]} з GET (лише непорожні)."""
+    attrs = {}
+    for param, attr in ATTR_PARAMS.items():
+        values = [v.strip() for v in request.GET.getlist(param) if v.strip()]
+        if values:
+            attrs[attr] = values
+    return attrs
+
+
+def attr_facets(index, selected, category=None, brands=None, within=None):
+    """
+    Групи фасетів для сайдбару: для кожного атрибута — значення з кількістю
+    товарів у поточній вибірці. Вибір у самому атрибуті не звужує його ж
+    лічильники, щоб можна було відмітити кілька значень.
+    within — маска наявності (stock_mask), якщо увімкнено in_stock.
+    """
+    if index is None:
+        return []
+    groups = []
+    for param, attr in ATTR_PARAMS.items():
+        others = {a: v for a, v in selected.items() if a != attr}
+        mask = index.match(category=category, brands=brands, within=within, **others)
+        counts = index.counts(attr, mask)
+        if not counts:
+            continue
+        chosen = set(selected.get(attr, ()))
+        if attr == 'weight':
+            values = sorted(counts, key=int)
+        else:
+            values = sorted(counts, key=str.lower)
+        groups.append({
+            'param': param,
+            'title': ATTR_TITLES[param],
+            'options': [
+                {
+                    'value': value,
+                    'label': weight_label(value) if attr == 'weight' else value,
+                    'count': counts[value],
+                    'checked': value in chosen,
+                }
+                for value in values
+            ],
+        })
+    return groups
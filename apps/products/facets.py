@@ -0,0 +1,104 @@
+"""
+Лічильники брендів для сайдбару лістингів.
+
+Замість GROUP BY по відфільтрованому Product на кожен запит сайдбар
+читає невелику таблицю BrandFacet (категорія × бренд × наявність ×
+ціновий кошик, лише активні товари) і сумує count по потрібному зрізу.
+Ціна фільтрується з точністю до кошика (BrandFacet.PRICE_BUCKET).
+
+Розміру / ваги / кольору в BrandFacet немає: якщо вони вибрані, лічильники
+рахуються по Product, звуженому маскою facet_index (products=...).
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Sum, Value
+from django.db.models.functions import Cast, Floor
+
+from .models import BrandFacet, Product
+
+FACET_BATCH_SIZE = 1000
+
+
+def price_bucket(price):
+    """Номер цінового кошика для ціни."""
+    return max(0, int(price // BrandFacet.PRICE_BUCKET))
+
+
+def _bucket_expr():
+    return Cast(Floor(F('price_eff') / Value(BrandFacet.PRICE_BUCKET)), IntegerField())
+
+
+def brand_counts(category=None, brands=None, price_min=None, price_max=None,
+                 in_stock=False, country_slug=None, products=None):
+    """
+    [{'brand__brand_slug', 'brand__name', 'count'}, ...] відсортовані за назвою бренду —
+    той самий формат, що й values().annotate(Count('id')) по Product.
+    price_min / price_max — Decimal або None (filters.parse_price).
+    products — Q по Product (FacetIndex.q для розміру / ваги / кольору):
+    тоді лічильники рахуються по Product з точною ціною.
+    """
+    low, high = price_min, price_max
+    if products is not None:
+        qs = Product.objects.filter(products, is_active=True)
+        count = Count('id')
+        price = 'price_eff'
+    else:
+        qs = BrandFacet.objects.all()
+        count = Sum('count')
+        price = 'price_bucket'
+        low = price_bucket(low) if low is not None else None
+        high = price_bucket(high) if high is not None else None
+
+    if category is not None:
+        qs = qs.filter(category=category)
+    if brands:
+        qs = qs.filter(brand__brand_slug__in=brands)
+    if low is not None:
+        qs = qs.filter(**{f'{price}__gte': low})
+    if high is not None:
+        qs = qs.filter(**{f'{price}__lte': high})
+    if in_stock:
+        qs = qs.filter(has_stock=True)
+    if country_slug:
+        qs = qs.filter(brand__country_slug__iexact=country_slug)
+
+    return list(
+        qs.values('brand__brand_slug', 'brand__name')
+          .annotate(count=count)
+          .order_by('brand__name')
+    )
+
+
+def refresh_brand_facets(category_ids=None):
+    """
+    Перераховує лічильники для category_ids (або всього каталогу, якщо None).
+    Рядки категорії замінюються цілком, тож видалені й деактивовані
+    товари з них зникають. Повертає кількість записаних рядків.
+    """
+    products = Product.objects.filter(is_active=True)
+    facets = BrandFacet.objects.all()
+    if category_ids is not None:
+        category_ids = {cid for cid in category_ids if cid}
+        if not category_ids:
+            return 0
+        products = products.filter(category_id__in=category_ids)
+        facets = facets.filter(category_id__in=category_ids)
+
+    rows = (products
+            .annotate(price_bucket=_bucket_expr())
+            .values('category_id', 'brand_id', 'has_stock', 'price_bucket')
+            .annotate(count=Count('id'))
+            .order_by())
+    objs = [BrandFacet(**row) for row in rows]
+
+    with transaction.atomic():
+        facets.delete()
+        BrandFacet.objects.bulk_create(objs, batch_size=FACET_BATCH_SIZE)
+    return len(objs)
+
+
+def refresh_brand_facets_for_products(product_ids):
+    category_ids = set(
+        Product.objects.filter(id__in=product_ids)
+        .values_list('category_id', flat=True).distinct()
+    )
+    return refresh_brand_facets(category_ids)
@@ -0,0 +1,33 @@
+"""
+Розбір GET-параметрів фільтрів лістингу — один раз і однаково для
+фільтрації, лічильників сайдбару та ключів кешу.
+"""
+from decimal import Decimal, InvalidOperation
+
+# ?in_stock=: JS сайдбару ставить '1', чекбокс форми без value — 'on'
+IN_STOCK_VALUES = frozenset({'1', 'on', 'true', 'yes'})
+
+# межа Product.price_eff (max_digits=10, decimal_places=2)
+MAX_PRICE = Decimal('99999999.99')
+
+
+def parse_price(value):
+    """
+    Decimal з ?price_min= / ?price_max=; None — якщо порожньо або не число.
+    Завеликі значення обрізаються до MAX_PRICE, щоб не переповнити decimal у SQL.
+    """
+    value = (value or '').strip().replace(',', '.')
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except (InvalidOperation, ValueError):
+        return None
+    if not price.is_finite() or price < 0:
+        return None
+    return min(price, MAX_PRICE).quantize(Decimal('0.01'))
+
+
+def parse_in_stock(value):
+    """Чи увімкнено ?in_stock= (однаково для фільтра, сайдбару і кешу кількості)."""
+    return (value or '').strip().lower() in IN_STOCK_VALUES
@@ -0,0 +1,169 @@
+"""
+Спільний рушій лістингів товарів: каталог, категорія, бренд, країна.
+
+Однакові для всіх сторінок:
+- per_page (20 за замовчуванням, максимум 100);
+- легкий prefetch варіантів у product.variants_for_card;
+- фільтри бренд / ціна / наявність / розмір / вага / колір;
+- пагінація (номери сторінок або курсор) з кешем кількості за scope;
+- обране користувача (apps.favourites.services, з кешу).
+
+Кількість запитів на сторінку фіксована і не залежить від per_page.
+"""
+from django.db.models import Prefetch
+from django.shortcuts import render
+
+from .facet_index import attr_facets, attr_q, facet_index, selected_attrs, stock_mask
+from .facets import brand_counts
+from .filters import parse_in_stock, parse_price
+from .models import Brand, Product_Variant
+from .pagination import DEFAULT_CURSOR_KEYS, paginate_listing
+
+from apps.favourites.services import favourite_state
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+CARD_VARIANT_FIELDS = (
+    'id', 'product_id', 'sku', 'retail_price', 'weight', 'size', 'color', 'image',
+    'warehouse_quantity',
+)
+
+
+def parse_per_page(request):
+    try:
+        per_page = int(request.GET.get('per_page', DEFAULT_PER_PAGE))
+    except (TypeError, ValueError):
+        per_page = DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def card_queryset(qs):
+    """Товари для карток: бренд, категорія з головною (для URL) та варіанти."""
+    variants_qs = (
+        Product_Variant.objects
+        .only(*CARD_VARIANT_FIELDS)
+        .order_by('retail_price')
+    )
+    return (
+        qs.select_related('brand', 'category__main_category')
+          .prefetch_related(
+              Prefetch('variants', queryset=variants_qs, to_attr='variants_for_card')
+          )
+    )
+
+
+def favourite_ids(request):
+    """(id варіантів, id товарів) в обраному — списками, як чекають шаблони."""
+    state = favourite_state(request)
+    return sorted(state.variant_ids), sorted(state.product_ids)
+
+
+def apply_filters(request, qs, category=None, country_slug=None, brand=None):
+    """
+    Фільтри сайдбару: бренд, ціна, наявність — по колонках Product
+    (price_eff / has_stock), розмір / вага / колір — через facet_index
+    (або attr_q, поки знімок не опубліковано).
+    brand — сторінка бренду: без ?brand= показується лише він, а сайдбар —
+    бренди тієї ж країни.
+    Повертає (qs, контекст для сайдбару).
+    """
+    selected_brands = request.GET.getlist('brand')
+    price_min       = parse_price(request.GET.get('price_min'))
+    price_max       = parse_price(request.GET.get('price_max'))
+    in_stock        = parse_in_stock(request.GET.get('in_stock'))
+
+    if selected_brands:
+        qs = qs.filter(brand__brand_slug__in=selected_brands)
+    elif brand is not None:
+        qs = qs.filter(brand=brand)
+    if price_min is not None:
+        qs = qs.filter(price_eff__gte=price_min)
+    if price_max is not None:
+        qs = qs.filter(price_eff__lte=price_max)
+    if in_stock:
+        qs = qs.filter(has_stock=True)
+
+    # розмір / вага / колір — через бітсети в пам'яті, без JOIN на варіанти
+    attrs = selected_attrs(request)
+    index = facet_index()
+    category_id = category.id if category is not None else None
+    scope_brands = selected_brands
+    if brand is not None:
+        country_slug = brand.country_slug
+        scope_brands = selected_brands or [brand.brand_slug]
+    elif country_slug and not scope_brands:
+        scope_brands = list(
+            Brand.objects.filter(country_slug__iexact=country_slug)
+            .values_list('brand_slug', flat=True)
+        )
+    # наявність — лише по has_stock у SQL (вище і в brand_counts), знімок її не знає
+    brand_scope = None
+    if attrs and index is None:
+        qs = qs.filter(attr_q(attrs))
+        brand_scope = attr_q(attrs)
+    elif attrs:
+        qs = qs.filter(index.q(index.match(category=category_id, brands=scope_brands, **attrs)))
+        # лічильники брендів — з тими ж розміром / вагою / кольором, але по всіх брендах
+        brand_scope = index.q(index.match(category=category_id, **attrs))
+    within = stock_mask(index, category_id) if in_stock and index is not None else None
+
+    brands_agg = brand_counts(
+        category=category,
+        # на сторінці бренду сайдбар — усі бренди країни, вибір їх не звужує
+        brands=selected_brands if brand is None else None,
+        price_min=price_min,
+        price_max=price_max,
+        in_stock=in_stock,
+        country_slug=country_slug,
+        products=brand_scope,
+    )
+    checked = set(scope_brands) if brand is not None else set(selected_brands)
+    brands_ctx = [
+        {
+            'slug':    b['brand__brand_slug'],
+            'name':    b['brand__name'],
+            'count':   b['count'],
+            'checked': b['brand__brand_slug'] in checked,
+        }
+        for b in brands_agg if b['brand__brand_slug']
+    ]
+
+    return qs, {
+        'brands':    brands_ctx,
+        'price_min': price_min if price_min is not None else '',
+        'price_max': price_max if price_max is not None else '',
+        'in_stock':  in_stock,
+        'selected_brands': selected_brands,
+        'attr_facets': attr_facets(
+            index, attrs, category=category_id, brands=scope_brands, within=within
+        ),
+    }
+
+
+def render_listing(request, template, products_qs, scope, context=None,
+                   cursor_keys=DEFAULT_CURSOR_KEYS):
+    """
+    Пагінує products_qs і рендерить шаблон лістингу.
+    scope — ідентифікатор лістингу для кешу кількості (див. pagination.listing_signature).
+    """
+    per_page = parse_per_page(request)
+    qs = card_queryset(products_qs)
+    if not qs.ordered:
+        qs = qs.order_by(*cursor_keys)
+
+    products, cursor_mode = paginate_listing(
+        request, qs, per_page, cursor_keys=cursor_keys, scope=scope
+    )
+    fav_variant_ids, fav_product_ids = favourite_ids(request)
+
+    ctx = {
+        'products': products,
+        'fav_variant_ids': fav_variant_ids,
+        'fav_product_ids': fav_product_ids,
+        'fav_ids': fav_product_ids,
+        'current_per_page': per_page,
+        'cursor_mode': cursor_mode,
+        **(context or {}),
+    }
+    return render(request, template, ctx)
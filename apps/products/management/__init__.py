@@ -0,0 +1 @@
+# Пусто
\ No newline at end of file
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from apps.products.caching import bump_catalog_version
+from apps.products.facet_index import warm_facet_index
+from apps.products.search import refresh_search_index
+
+
+class Command(BaseCommand):
+    help = "Перебудовує пошуковий індекс товарів (products_search_index)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='*', type=int,
+                            help='Перебудувати лише вказані Product.id')
+
+    def handle(self, *args, **opts):
+        ids = opts.get('ids')
+        total = refresh_search_index(ids if ids else None)
+        bump_catalog_version()
+        warm_facet_index()
+        self.stdout.write(self.style.SUCCESS(f"Пошуковий індекс оновлено: товарів = {total}"))
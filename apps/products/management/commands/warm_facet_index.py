@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.products.facet_index import warm_facet_index
+
+
+class Command(BaseCommand):
+    help = "Будує індекс фасетів і публікує його в спільний кеш (для деплою)"
+
+    def handle(self, *args, **opts):
+        index = warm_facet_index()
+        self.stdout.write(self.style.SUCCESS(f"Індекс фасетів побудовано: товарів = {len(index.ids)}"))
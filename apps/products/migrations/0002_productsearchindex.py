@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='products.product')),
+                ('title', models.CharField(blank=True, default='', max_length=255)),
+                ('document', models.TextField(blank=True, default='')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(blank=True, null=True)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Пошуковий індекс',
+                'verbose_name_plural': 'Пошуковий індекс',
+                'db_table': 'products_search_index',
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['vector'], name='products_search_vector_gin'), django.contrib.postgres.indexes.GinIndex(fields=['document'], name='products_search_doc_trgm', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:20
+
+import re
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+from unidecode import unidecode
+
+# Копія models.search_key на момент міграції: міграція не повинна залежати
+# від подальших змін коду застосунку.
+SEARCH_KEY_RULES = (
+    (re.compile(r"[^a-z0-9]+"), " "),
+    (re.compile(r"dzh"), "j"),
+    (re.compile(r"kh"), "h"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"ck|q"), "k"),
+    (re.compile(r"c(?!h)"), "k"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"[yj]"), "i"),
+    (re.compile(r"([a-z])\1+"), r"\1"),
+)
+
+
+def search_key(value):
+    if not value:
+        return ""
+    s = unidecode(str(value).replace("'", "").replace("’", ""))
+    s = s.lower().replace("'", "")
+    for pattern, repl in SEARCH_KEY_RULES:
+        s = pattern.sub(repl, s)
+    return " ".join(s.split())
+
+
+def fill_search_key(apps, schema_editor):
+    ProductSearchIndex = apps.get_model('products', 'ProductSearchIndex')
+    batch = []
+    for row in ProductSearchIndex.objects.only('product_id', 'document').iterator(chunk_size=1000):
+        row.search_key = search_key(row.document)
+        batch.append(row)
+        if len(batch) >= 1000:
+            ProductSearchIndex.objects.bulk_update(batch, ['search_key'])
+            batch = []
+    if batch:
+        ProductSearchIndex.objects.bulk_update(batch, ['search_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_productsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsearchindex',
+            name='search_key',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunPython(fill_search_key, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='productsearchindex',
+            name='products_search_doc_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='productsearchindex',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_key'], name='products_search_key_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
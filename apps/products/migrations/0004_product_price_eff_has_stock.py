@@ -0,0 +1,69 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import (
+    Case, DecimalField, Exists, F, Min, OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+
+def fill_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product_Variant = apps.get_model('products', 'Product_Variant')
+
+    min_price = Subquery(
+        Product_Variant.objects
+        .filter(product_id=OuterRef('pk'))
+        .order_by()
+        .values('product_id')
+        .annotate(m=Min('retail_price'))
+        .values('m')[:1],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    variant_in_stock = Exists(
+        Product_Variant.objects.filter(product_id=OuterRef('pk'), warehouse_quantity__gt=0)
+    )
+    Product.objects.update(
+        min_variant_price=min_price,
+        price_eff=Coalesce(min_price, F('retail_price')),
+        has_stock=Case(
+            When(Q(warehouse_quantity__gt=0) | variant_in_stock, then=Value(True)),
+            default=Value(False),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_productsearchindex_search_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='min_variant_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Мін. ціна варіанта'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_eff',
+            field=models.DecimalField(db_default=Decimal('0.00'), db_index=True, decimal_places=2, editable=False, max_digits=10, verbose_name='Ефективна ціна'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='has_stock',
+            field=models.BooleanField(db_default=False, db_index=True, editable=False, verbose_name='Є в наявності'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'has_stock', 'price_eff'], name='products_cat_stock_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', 'has_stock', 'price_eff'], name='products_brand_stock_price'),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
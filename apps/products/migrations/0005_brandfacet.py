@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_brand_facets(apps, schema_editor):
+    # Product.is_active є в моделі, але не в історичному стані міграцій —
+    # ORM тут його не бачить, тож SQL і перевірка колонки в БД
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        columns = {c.name for c in connection.introspection.get_table_description(cursor, 'products_product')}
+        is_active = 'is_active' if 'is_active' in columns else 'TRUE'
+        cursor.execute(f"""
+            INSERT INTO products_brand_facet (category_id, brand_id, is_active, has_stock, price_eff, count)
+            SELECT category_id, brand_id, {is_active}, has_stock, price_eff, COUNT(*)
+            FROM products_product
+            GROUP BY 1, 2, 3, 4, 5
+        """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_price_eff_has_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrandFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField()),
+                ('has_stock', models.BooleanField()),
+                ('price_eff', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('count', models.PositiveIntegerField()),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.brand')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.category')),
+            ],
+            options={
+                'verbose_name': 'Лічильник бренду',
+                'verbose_name_plural': 'Лічильники брендів',
+                'db_table': 'products_brand_facet',
+                'indexes': [models.Index(fields=['brand', 'has_stock', 'price_eff'], name='products_facet_brand_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'brand', 'is_active', 'has_stock', 'price_eff'), name='products_brand_facet_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_brand_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_brandfacet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved_quantity',
+            field=models.IntegerField(db_default=0, editable=False, verbose_name='Зарезервовано'),
+        ),
+        migrations.AddField(
+            model_name='product_variant',
+            name='reserved_quantity',
+            field=models.IntegerField(db_default=0, editable=False, verbose_name='Зарезервовано'),
+        ),
+    ]
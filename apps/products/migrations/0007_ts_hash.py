@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='ts_hash',
+            field=models.CharField(db_default='', editable=False, max_length=40, verbose_name='Хеш рядка Торгсофт'),
+        ),
+        migrations.AddField(
+            model_name='product_variant',
+            name='ts_hash',
+            field=models.CharField(db_default='', editable=False, max_length=40, verbose_name='Хеш рядка Торгсофт'),
+        ),
+    ]
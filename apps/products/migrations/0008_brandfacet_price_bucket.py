@@ -0,0 +1,66 @@
+# Generated by Django 5.2.3 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+# BrandFacet.PRICE_BUCKET на момент міграції
+PRICE_BUCKET = 50
+
+
+def clear_brand_facets(apps, schema_editor):
+    apps.get_model('products', 'BrandFacet').objects.all().delete()
+
+
+def fill_brand_facets(apps, schema_editor):
+    # Product.is_active не в історичному стані міграцій (див. 0005) — SQL
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        columns = {c.name for c in connection.introspection.get_table_description(cursor, 'products_product')}
+        where = 'WHERE is_active' if 'is_active' in columns else ''
+        cursor.execute(f"""
+            INSERT INTO products_brand_facet (category_id, brand_id, has_stock, price_bucket, count)
+            SELECT category_id, brand_id, has_stock, GREATEST(0, FLOOR(price_eff / %s))::int, COUNT(*)
+            FROM products_product
+            {where}
+            GROUP BY 1, 2, 3, 4
+        """, [PRICE_BUCKET])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_ts_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_brand_facets, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='brandfacet',
+            name='products_brand_facet_uniq',
+        ),
+        migrations.RemoveIndex(
+            model_name='brandfacet',
+            name='products_facet_brand_idx',
+        ),
+        migrations.RemoveField(
+            model_name='brandfacet',
+            name='is_active',
+        ),
+        migrations.RemoveField(
+            model_name='brandfacet',
+            name='price_eff',
+        ),
+        migrations.AddField(
+            model_name='brandfacet',
+            name='price_bucket',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='brandfacet',
+            constraint=models.UniqueConstraint(fields=('category', 'brand', 'has_stock', 'price_bucket'), name='products_brand_facet_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='brandfacet',
+            index=models.Index(fields=['brand', 'has_stock', 'price_bucket'], name='products_facet_brand_idx'),
+        ),
+        migrations.RunPython(fill_brand_facets, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,13 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.db.models.functions import Now
 from decimal import Decimal
+import re
 from unidecode import unidecode
 
 def slugify_smart(value: str, *, allow_unicode=False) -> str:
@@ -19,6 +22,37 @@ def slugify_smart(value: str, *, allow_unicode=False) -> str:
         s = unidecode(s)  # кирилиця -> латиниця
     return slugify(s, allow_unicode=allow_unicode)  # зазвич. ASCII
 
+# Згладжування різниць латинського написання після unidecode,
+# щоб "Royal Canin" і "Роял Канін" давали однаковий ключ.
+SEARCH_KEY_RULES = (
+    (re.compile(r"[^a-z0-9]+"), " "),
+    (re.compile(r"dzh"), "j"),
+    (re.compile(r"kh"), "h"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"ck|q"), "k"),
+    (re.compile(r"c(?!h)"), "k"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"[yj]"), "i"),
+    (re.compile(r"([a-z])\1+"), r"\1"),
+)
+
+def search_key(value: str) -> str:
+    """
+    Нормалізований пошуковий ключ: та сама транслітерація, що й у slugify_smart,
+    плюс згладжування латинського написання.
+    Напр.: "Роял Канін" -> "roial kanin", "Royal Canin" -> "roial kanin"
+    """
+    if not value:
+        return ""
+    s = str(value).replace("'", "").replace("’", "")
+    if unidecode:
+        s = unidecode(s)  # кирилиця -> латиниця
+    s = s.lower().replace("'", "")
+    for pattern, repl in SEARCH_KEY_RULES:
+        s = pattern.sub(repl, s)
+    return " ".join(s.split())
+
 def slug_base(*parts: str, fallback: str = "item") -> str:
     """
     Склеює непорожні частини, латинізує та slugify.
@@ -28,6 +62,18 @@ def slug_base(*parts: str, fallback: str = "item") -> str:
         return slugify_smart("-".join(cleaned))
     return fallback
 
+def product_slug_base(name, sku, torgsoft_id=None, barcode=None) -> str:
+    base = slug_base(name, sku)
+    if base == "item":  # якщо і name, і sku порожні
+        base = slug_base(torgsoft_id) if torgsoft_id else slug_base(barcode)
+    return base
+
+def variant_slug_base(product_name, weight, color, size, sku, barcode=None, torgsoft_id=None) -> str:
+    base = slug_base(product_name or None, weight, color, size, sku)
+    if base == "item":
+        base = slug_base(barcode) if barcode else slug_base(torgsoft_id, fallback="variant")
+    return base
+
 def unique_slugify(model_cls, base_slug, pk=None, slug_field='slug'):
     """
     Генерує унікальний slug: base, base-2, base-3, ...
@@ -126,7 +172,27 @@ class Product(models.Model):
         null=True, blank=True
     )
     warehouse_quantity = models.IntegerField("Наявність", db_default=0)
-
+    # Зарезервовано оформленими, але ще не синхронізованими замовленнями
+    # (apps.orders.reservations). Доступно = warehouse_quantity - reserved_quantity.
+    reserved_quantity = models.IntegerField("Зарезервовано", db_default=0, editable=False)
+    # Хеш рядка Торгсофту, з якого товар востаннє синхронізовано
+    # (apps.ts_ftps.parser.row_hash): незмінні рядки sync_ts_direct пропускає.
+    ts_hash = models.CharField("Хеш рядка Торгсофт", max_length=40, db_default='', editable=False)
+
+    # Денормалізовані поля для фільтрів/сортування лістингів.
+    # Перераховуються aggregates.refresh_product_aggregates() після
+    # синхронізації з Торгсофтом, змін в адмінці та кабінеті менеджера.
+    min_variant_price = models.DecimalField(
+        "Мін. ціна варіанта", max_digits=10, decimal_places=2,
+        null=True, blank=True, editable=False,
+    )
+    price_eff = models.DecimalField(
+        "Ефективна ціна", max_digits=10, decimal_places=2,
+        db_default=Decimal('0.00'), db_index=True, editable=False,
+    )
+    has_stock = models.BooleanField(
+        "Є в наявності", db_default=False, db_index=True, editable=False,
+    )
 
     is_active = models.BooleanField(
         default=True,
@@ -134,8 +200,14 @@ class Product(models.Model):
         db_default=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'has_stock', 'price_eff'], name='products_cat_stock_price'),
+            models.Index(fields=['brand', 'has_stock', 'price_eff'], name='products_brand_stock_price'),
+        ]
+
     def rebuild_slug(self):
-        base = slug_base(self.name, self.sku) or slug_base(self.torgsoft_id) or slug_base(self.barcode)
+        base = product_slug_base(self.name, self.sku, self.torgsoft_id, self.barcode)
         self.slug = unique_slugify(Product, base, pk=self.pk)
 
     def weight_kg(self):
@@ -146,12 +218,14 @@ class Product(models.Model):
         g = self.weight
         return f"{g}g" if g < 1000 or g % 1000 != 0 else f"{g // 1000}kg"
 
+    @property
+    def available_quantity(self):
+        return self.warehouse_quantity - self.reserved_quantity
+
     def save(self, *args, **kwargs):
         # Генеруємо тільки якщо порожній
         # if not self.slug:
-        base = slug_base(self.name, self.sku)
-        if base == "item":  # якщо і name, і sku порожні
-            base = slug_base(self.torgsoft_id) if self.torgsoft_id else slug_base(self.barcode)
+        base = product_slug_base(self.name, self.sku, self.torgsoft_id, self.barcode)
         self.slug = unique_slugify(Product, base, pk=self.pk)
         super().save(*args, **kwargs)
 
@@ -192,6 +266,8 @@ class Product_Variant(models.Model):
         null=True, blank=True
     )
     warehouse_quantity = models.IntegerField("Наявність", db_default=0)
+    reserved_quantity = models.IntegerField("Зарезервовано", db_default=0, editable=False)
+    ts_hash = models.CharField("Хеш рядка Торгсофт", max_length=40, db_default='', editable=False)
 
     is_active = models.BooleanField(
         default=True,
@@ -200,12 +276,10 @@ class Product_Variant(models.Model):
     )
 
     def rebuild_slug(self):
-        base = slug_base(
+        base = variant_slug_base(
             self.product.name if self.product_id and getattr(self, 'product', None) and self.product.name else None,
-            self.weight, self.color, self.size, self.sku
+            self.weight, self.color, self.size, self.sku, self.barcode, self.torgsoft_id
         )
-        if base == "item":
-            base = slug_base(self.barcode) if self.barcode else slug_base(self.torgsoft_id, fallback="variant")
         self.slug = unique_slugify(Product_Variant, base, pk=self.pk)
 
     def weight_kg(self):
@@ -216,14 +290,16 @@ class Product_Variant(models.Model):
         g = self.weight
         return f"{g}g" if g < 1000 or g % 1000 != 0 else f"{g // 1000}kg"
 
+    @property
+    def available_quantity(self):
+        return self.warehouse_quantity - self.reserved_quantity
+
     def save(self, *args, **kwargs):
         # if not self.slug:
-        base = slug_base(
+        base = variant_slug_base(
             self.product.name if self.product_id and getattr(self, 'product', None) and self.product.name else None,
-            self.weight, self.color, self.size, self.sku
+            self.weight, self.color, self.size, self.sku, self.barcode, self.torgsoft_id
         )
-        if base == "item":
-            base = slug_base(self.barcode) if self.barcode else slug_base(self.torgsoft_id, fallback="variant")
         self.slug = unique_slugify(Product_Variant, base, pk=self.pk)
         super().save(*args, **kwargs)
 
@@ -235,6 +311,76 @@ class Product_Variant(models.Model):
     def __str__(self):
         return f"{self.product.name} — {self.sku}"
 
+class ProductSearchIndex(models.Model):
+    """
+    Пошуковий індекс товару (один рядок на Product).
+    title      — назва товару (вага A у tsvector),
+    document   — назва, артикул, штрихкод товару та всіх його варіантів (вага B),
+    search_key — document через search_key(): латиниця/кирилиця зводяться до одного ключа.
+    Заповнюється apps.products.search.refresh_search_index(): після sync_ts_direct,
+    імпорту з Торгсофту, командою rebuild_search_index, сигналом на збереження
+    товару/варіанта та після migrate для товарів без рядка індексу.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE,
+        primary_key=True, related_name='search_index'
+    )
+    title = models.CharField(max_length=255, blank=True, default='')
+    document = models.TextField(blank=True, default='')
+    search_key = models.TextField(blank=True, default='')
+    vector = SearchVectorField(null=True, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'products_search_index'
+        verbose_name = 'Пошуковий індекс'
+        verbose_name_plural = 'Пошуковий індекс'
+        indexes = [
+            GinIndex(fields=['vector'], name='products_search_vector_gin'),
+            GinIndex(fields=['search_key'], name='products_search_key_trgm',
+                     opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: {self.title}'
+
+class BrandFacet(models.Model):
+    """
+    Матеріалізовані лічильники для сайдбару брендів: кількість активних
+    товарів на (категорія, бренд, наявність, ціновий кошик). Кошик —
+    floor(price_eff / PRICE_BUCKET), тож рядків на бренд у категорії
+    стільки, скільки цінових кошиків, а не товарів; фільтр ціни
+    застосовується з точністю до кошика.
+    Неактивні та видалені товари в таблицю не потрапляють.
+    Перераховується facets.refresh_brand_facets() по категоріях після sync_ts_direct,
+    змін і видалення в адмінці та кабінеті менеджера.
+    """
+    PRICE_BUCKET = 50
+
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='+')
+    has_stock = models.BooleanField()
+    price_bucket = models.PositiveIntegerField()
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = 'products_brand_facet'
+        verbose_name = 'Лічильник бренду'
+        verbose_name_plural = 'Лічильники брендів'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'brand', 'has_stock', 'price_bucket'],
+                name='products_brand_facet_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['brand', 'has_stock', 'price_bucket'], name='products_facet_brand_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.category_id}/{self.brand_id}: {self.count}'
+
 class PopularProduct(models.Model):
     product   = models.OneToOneField(
         Product, on_delete=models.CASCADE, related_name='popular'
@@ -0,0 +1,214 @@
+"""
+Пагінація лістингів товарів.
+
+Звичайний режим — Django Paginator (номери сторінок).
+Режим курсора (?cursor=...) — keyset-пагінація для "Показати ще"/нескінченного
+скролу: без COUNT(*) і без OFFSET, наступна сторінка береться умовою
+(price, id) > (останній price, останній id) по стабільних ключах сортування.
+
+Кількість товарів для номерів сторінок кешується за сигнатурою фільтрів
+(listing_signature) разом з catalog_version(), тож гортання сторінок і зміна
+per_page не повторюють COUNT(*), а синхронізація з Торгсофтом/кабінет
+менеджера інвалідують лічильники через bump_catalog_version().
+"""
+import base64
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .caching import catalog_version
+from .facet_index import ATTR_PARAMS
+from .filters import parse_in_stock, parse_price
+
+CURSOR_PARAM = 'cursor'
+DEFAULT_CURSOR_KEYS = ('price_eff', 'id')
+COUNT_CACHE_TIMEOUT = 60 * 30
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _cursor_decimal(value):
+    value = Decimal(value)
+    if not value.is_finite():
+        raise ValueError(value)
+    return value
+
+
+# тип значення курсора за ключем сортування; інші ключі — рядки
+CURSOR_TYPES = {
+    'price_eff': _cursor_decimal,
+    'id': int,
+    'pk': int,
+}
+
+
+def decode_cursor(token, keys):
+    """
+    Значення курсора, приведені до типів ключів keys, або None (перша
+    сторінка), якщо курсор порожній, пошкоджений чи підроблений — інакше
+    сміття в ?cursor= дійшло б до SQL і впало 500-кою.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        return None
+    if (not isinstance(values, list) or len(values) != len(keys)
+            or not all(isinstance(v, str) for v in values)):
+        return None
+    try:
+        return [CURSOR_TYPES.get(key, str)(value) for key, value in zip(keys, values)]
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+
+
+def _price_key(value):
+    price = parse_price(value)
+    return '' if price is None else str(price.normalize())
+
+
+def listing_signature(request, scope):
+    """
+    Нормалізована сигнатура лістингу: scope (каталог / категорія / бренд /
+    країна) + фільтри. Порядок брендів, пробіли та page/per_page/cursor
+    на кількість не впливають і в сигнатуру не входять.
+    """
+    return json.dumps({
+        'scope': scope,
+        'brands': sorted(set(request.GET.getlist('brand'))),
+        'price_min': _price_key(request.GET.get('price_min')),
+        'price_max': _price_key(request.GET.get('price_max')),
+        'in_stock': parse_in_stock(request.GET.get('in_stock')),
+        'attrs': {
+            param: sorted(set(request.GET.getlist(param)))
+            for param in ATTR_PARAMS
+            if request.GET.getlist(param)
+        },
+    }, sort_keys=True, separators=(',', ':'))
+
+
+def _count_cache_key(signature):
+    digest = hashlib.md5(signature.encode()).hexdigest()
+    return f'products:count:{catalog_version()}:{digest}'
+
+
+def cached_count(qs, signature):
+    if not signature:
+        return qs.count()
+    key = _count_cache_key(signature)
+    count = cache.get(key)
+    if count is None:
+        count = qs.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, що бере count з кешу за сигнатурою фільтрів."""
+
+    def __init__(self, object_list, per_page, signature=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.signature = signature
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.signature)
+
+
+def _after(keys, values):
+    """
+    (k1, k2, ...) > (v1, v2, ...) у лексикографічному порядку:
+    k1 > v1  OR  (k1 = v1 AND k2 > v2)  OR ...
+    """
+    cond = Q()
+    for i, key in enumerate(keys):
+        step = Q(**{f'{key}__gt': values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            step &= Q(**{prev_key: prev_value})
+        cond |= step
+    return cond
+
+
+class CursorPage:
+    """
+    Сторінка keyset-пагінації. count — None, якщо його не просили (?count=1):
+    для "Показати ще" загальна кількість не потрібна.
+    """
+
+    def __init__(self, object_list, per_page, next_cursor=None, next_query='', count=None):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.next_query = next_query
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return False
+
+    def has_other_pages(self):
+        return self.has_next()
+
+
+def cursor_paginate(request, qs, per_page, keys=DEFAULT_CURSOR_KEYS, signature=None):
+    keys = tuple(keys)
+    count = cached_count(qs, signature) if request.GET.get('count') == '1' else None
+
+    values = decode_cursor(request.GET.get(CURSOR_PARAM), keys)
+    if values is not None:
+        qs = qs.filter(_after(keys, values))
+
+    rows = list(qs.order_by(*keys)[:per_page + 1])
+    next_cursor = None
+    next_query = ''
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor([getattr(rows[-1], k) for k in keys])
+        params = request.GET.copy()
+        params[CURSOR_PARAM] = next_cursor
+        params.pop('page', None)
+        next_query = params.urlencode()
+
+    return CursorPage(rows, per_page, next_cursor, next_query, count)
+
+
+def paginate_listing(request, qs, per_page, cursor_keys=DEFAULT_CURSOR_KEYS, scope=None):
+    """
+    Повертає (page, cursor_mode). Курсорний режим вмикається наявністю
+    параметра ?cursor= (порожній — перша сторінка).
+    scope — ідентифікатор лістингу для кешу кількості (None — без кешу).
+    """
+    signature = listing_signature(request, scope) if scope else None
+    if CURSOR_PARAM in request.GET:
+        return cursor_paginate(request, qs, per_page, cursor_keys, signature), True
+
+    paginator = CachedCountPaginator(qs, per_page, signature=signature)
+    page = request.GET.get('page', 1)
+    try:
+        products = paginator.page(page)
+    except PageNotAnInteger:
+        products = paginator.page(1)
+    except EmptyPage:
+        products = paginator.page(paginator.num_pages)
+    return products, False
@@ -0,0 +1,300 @@
+"""
+Пошук по каталогу через таблицю products_search_index.
+
+Індекс містить tsvector (GIN) та trigram GIN по search_key, тому пошук
+не робить seq scan по Product/Product_Variant і не рахує Min() по варіантах:
+ранжування та ціна беруться прямо з індексу.
+
+search_key — транслітерований ключ (models.search_key), тож "royal canin",
+"роял канін" і набране не в тій розкладці "hjzk" шукаються одним запитом.
+"""
+import re
+import threading
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .caching import LRUCache, catalog_version
+from .models import Product, Product_Variant, ProductSearchIndex, search_key
+
+# 'simple' — без стемінгу: для української в PostgreSQL немає словника,
+# а артикули/штрихкоди стемити і не треба.
+SEARCH_CONFIG = 'simple'
+INDEX_BATCH_SIZE = 1000
+MIN_KEY_LENGTH = 2
+SUGGEST_LIMIT = 3
+SUGGEST_CACHE_SIZE = 4096
+SUGGEST_CACHE_TTL = 300
+
+# (версія каталогу, нормалізований префікс) -> готові items для JSON
+_suggest_cache = LRUCache(maxsize=SUGGEST_CACHE_SIZE, ttl=SUGGEST_CACHE_TTL)
+
+# товари, збережені поштучно (сигнали) і ще не переіндексовані в цьому потоці
+_pending = threading.local()
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_CYRILLIC_RE = re.compile(r'[а-яёіїєґ]', re.IGNORECASE)
+
+# Українська розкладка ЙЦУКЕН поверх QWERTY
+EN_UK_LAYOUT = dict(zip(
+    "qwertyuiop[]asdfghjkl;'zxcvbnm,.",
+    "йцукенгшщзхїфівапролджєячсмитьбю",
+))
+UK_EN_LAYOUT = {uk: en for en, uk in EN_UK_LAYOUT.items()}
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def _join(*parts):
+    return ' '.join(str(p).strip() for p in parts if p and str(p).strip())
+
+
+def swap_layout(text):
+    """
+    Перенабирає текст в іншій розкладці: "hjzk" -> "роял", "кщнфд" -> "royal".
+    """
+    text = (text or '').lower()
+    table = UK_EN_LAYOUT if _CYRILLIC_RE.search(text) else EN_UK_LAYOUT
+    return ''.join(table.get(ch, ch) for ch in text)
+
+
+def expand_query(q):
+    """
+    Для кожного слова запиту — множина варіантів search_key:
+    як введено та як мало б бути введено в іншій розкладці.
+    "hjzk rfyby" -> [{'hizk', 'roial'}, {'rfibi', 'kanin'}]
+    """
+    groups = []
+    for raw in (q or '').lower().split():
+        keys = {search_key(raw), search_key(swap_layout(raw))} - {''}
+        if keys:
+            groups.append(keys)
+    return groups
+
+
+def _key_q(key):
+    # короткий ключ ("4" у "Club 4 Paws") як підрядок збігається майже з усім,
+    # тож шукається лише цілим словом
+    if len(key) < MIN_KEY_LENGTH:
+        return Q(search_key__regex=rf'\m{re.escape(key)}\M')
+    return Q(search_key__contains=key)
+
+
+def _key_match(groups):
+    """Кожне слово (в будь-якому з варіантів) має входити в search_key."""
+    cond = Q()
+    for keys in groups:
+        alternatives = Q()
+        for key in keys:
+            alternatives |= _key_q(key)
+        cond &= alternatives
+    return cond
+
+
+def prefix_query(q):
+    """
+    "роял кан" -> to_tsquery('роял:* & кан:*'): кожне слово як префікс,
+    щоб підказки працювали вже на неповному слові.
+    """
+    tokens = _tokens(q)
+    if not tokens:
+        return None
+    raw = ' & '.join(f'{t}:*' for t in tokens)
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_index(q):
+    """
+    Рядки ProductSearchIndex, що відповідають запиту, відсортовані за rank.
+    Збіг — по tsvector (префікси слів) або по search_key
+    (транслітерація/розкладка, одруківки через триграми).
+    rank = ts_rank (назва важить більше за варіанти/артикули)
+         + схожість search_key по триграмах (як введено або в іншій розкладці)
+         + бонус за точний збіг / початок назви.
+    """
+    query = prefix_query(q)
+    groups = expand_query(q)
+    if query is None or not groups:
+        return ProductSearchIndex.objects.none()
+    needle = q.strip().lower()
+    key = search_key(q)
+    swapped_key = search_key(swap_layout(q))
+
+    match = Q(vector=query) | _key_match(groups)
+    if key:
+        match |= Q(search_key__trigram_word_similar=key)
+
+    return (
+        ProductSearchIndex.objects
+        .filter(match)
+        .annotate(
+            rank=SearchRank(F('vector'), query)
+            + Greatest(
+                TrigramWordSimilarity(Value(key), 'search_key'),
+                TrigramWordSimilarity(Value(swapped_key), 'search_key'),
+            )
+            + Case(
+                When(title=needle, then=Value(1.0)),
+                When(title__startswith=needle, then=Value(0.5)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+        .order_by('-rank', 'product_id')
+    )
+
+
+def search_hits(q, limit):
+    """
+    Перші limit результатів одним запитом: рядок індексу (rank, price)
+    разом з товаром і категоріями, потрібними для get_absolute_url().
+    Спільна точка для search_suggest, quick_search і сторінки результатів.
+    """
+    return list(
+        search_index(q)
+        .select_related('product__category__main_category')
+        .only(
+            'product_id', 'price',
+            'product__id', 'product__name', 'product__slug', 'product__image',
+            'product__category__id', 'product__category__slug',
+            'product__category__main_category__id', 'product__category__main_category__slug',
+        )[:limit]
+    )
+
+
+def best_match_url(q):
+    """URL найкращого збігу для запиту або None, якщо нічого не знайдено."""
+    hits = search_hits(q, 1)
+    if not hits:
+        return None
+    return hits[0].product.get_absolute_url() or None
+
+
+def suggest_items(q):
+    """
+    Підказки для search_suggest. Однакові префікси приходять тисячі разів
+    на день, тому результат кешується в пам'яті процесу; ключ містить
+    catalog_version(), яку піднімає синхронізація з Торгсофтом.
+    """
+    prefix = ' '.join(q.lower().split())
+    key = (catalog_version(), prefix)
+    items = _suggest_cache.get(key)
+    if items is not None:
+        return items
+
+    items = []
+    for hit in search_hits(prefix, SUGGEST_LIMIT):
+        p = hit.product
+        items.append({
+            "id": p.id,
+            "name": p.name,
+            "url": p.get_absolute_url(),
+            "image": (p.image.url if getattr(p, "image", None) else ""),
+            "price": float(hit.price) if hit.price is not None else None,
+        })
+    _suggest_cache.set(key, items)
+    return items
+
+
+def _index_batch(rows):
+    ids = [r[0] for r in rows]
+
+    variant_docs = {}
+    min_price = {}
+    variants = (Product_Variant.objects
+                .filter(product_id__in=ids)
+                .order_by()
+                .values_list('product_id', 'name', 'sku', 'barcode', 'retail_price'))
+    for pid, name, sku, barcode, price in variants:
+        variant_docs.setdefault(pid, []).append(_join(name, sku, barcode))
+        if price is not None and (pid not in min_price or price < min_price[pid]):
+            min_price[pid] = price
+
+    objs = []
+    for pid, name, sku, barcode, retail_price in rows:
+        document = _join(name, sku, barcode, *variant_docs.get(pid, ())).lower()
+        objs.append(ProductSearchIndex(
+            product_id=pid,
+            title=(name or '').strip().lower()[:255],
+            document=document,
+            search_key=search_key(document),
+            price=min_price.get(pid, retail_price),
+        ))
+
+    with transaction.atomic():
+        ProductSearchIndex.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['title', 'document', 'search_key', 'price', 'updated_at'],
+        )
+        ProductSearchIndex.objects.filter(product_id__in=ids).update(
+            vector=SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('document', weight='B', config=SEARCH_CONFIG)
+        )
+    return len(objs)
+
+
+def refresh_search_index(product_ids=None, batch_size=INDEX_BATCH_SIZE):
+    """
+    Перебудовує рядки індексу для product_ids (або для всього каталогу, якщо None).
+    Повертає кількість оновлених товарів.
+    """
+    products = Product.objects.order_by('id')
+    pending = _pending_ids()
+    if product_ids is not None:
+        product_ids = set(product_ids)
+        pending -= product_ids
+        if not product_ids:
+            return 0
+        products = products.filter(id__in=product_ids)
+    else:
+        pending.clear()
+
+    total = 0
+    batch = []
+    rows = products.values_list('id', 'name', 'sku', 'barcode', 'retail_price')
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            total += _index_batch(batch)
+            batch = []
+    if batch:
+        total += _index_batch(batch)
+    return total
+
+
+def _pending_ids():
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    return _pending.ids
+
+
+def _index_pending():
+    pending = _pending_ids()
+    if pending:
+        ids = set(pending)
+        pending.clear()
+        refresh_search_index(ids)
+
+
+def schedule_index(product_id):
+    """
+    Переіндексує товар після коміту поточної транзакції. Збереження в одній
+    транзакції (імпорт, інлайни адмінки) індексуються однією пачкою;
+    явний refresh_search_index() знімає товари з черги.
+    """
+    _pending_ids().add(product_id)
+    transaction.on_commit(_index_pending)
+
+
+def index_missing_products(batch_size=INDEX_BATCH_SIZE):
+    """Індексує товари, для яких ще немає рядка ProductSearchIndex."""
+    ids = list(Product.objects.filter(search_index__isnull=True).values_list('id', flat=True))
+    return refresh_search_index(ids, batch_size) if ids else 0
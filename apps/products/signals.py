@@ -0,0 +1,30 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Product, Product_Variant, ProductSearchIndex
+from .search import index_missing_products, schedule_index
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_index(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Product_Variant)
+def index_variant_product(sender, instance, raw=False, **kwargs):
+    # назви/артикули варіантів і мінімальна ціна входять у рядок товару
+    if not raw and instance.product_id:
+        schedule_index(instance.product_id)
+
+
+def index_missing_after_migrate(sender, using, **kwargs):
+    # migrate може зупинитись на ранній міграції — тоді індексувати нікуди
+    connection = connections[using]
+    table = ProductSearchIndex._meta.db_table
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return
+        columns = {c.name for c in connection.introspection.get_table_description(cursor, table)}
+    if {f.column for f in ProductSearchIndex._meta.concrete_fields} <= columns:
+        index_missing_products()
@@ -0,0 +1,15 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def warm_facet_index_task():
+    """
+    Перебудовує знімок facet_index у спільному кеші, поки попередній
+    не протух (FACET_INDEX_MAX_AGE). Запускається кожні 5 хвилин через Celery Beat
+    """
+    from .facet_index import warm_facet_index
+    index = warm_facet_index()
+    return len(index.ids)
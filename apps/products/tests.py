@@ -1,3 +1,67 @@
-from django.test import TestCase
+import base64
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .models import search_key
+from .pagination import DEFAULT_CURSOR_KEYS, decode_cursor, encode_cursor
+from .search import _key_q, expand_query, swap_layout
+
+
+def raw_cursor(values):
+    """Курсор з довільним JSON — як його може підробити клієнт."""
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+class SearchKeyTests(SimpleTestCase):
+    """Транслітерація, згладжування написання і розкладка клавіатури."""
+
+    def test_latin_and_cyrillic_give_same_key(self):
+        self.assertEqual(search_key('Royal Canin'), 'roial kanin')
+        self.assertEqual(search_key('Роял Канін'), 'roial kanin')
+
+    def test_spelling_is_folded(self):
+        self.assertEqual(search_key('Хаус'), search_key('Haus'))
+        self.assertEqual(search_key('Canin'), search_key('Kanin'))
+        self.assertEqual(search_key("Пес'ик"), search_key('Песик'))
+        self.assertEqual(search_key(''), '')
+
+    def test_swap_layout(self):
+        self.assertEqual(swap_layout('hjzk'), 'роял')
+        self.assertEqual(swap_layout('кщнфд'), 'royal')
+
+    def test_expand_query_adds_other_layout(self):
+        self.assertEqual(expand_query('hjzk rfyby'), [{'hizk', 'roial'}, {'rfibi', 'kanin'}])
+
+    def test_one_character_tokens_are_kept_as_whole_words(self):
+        groups = expand_query('Club 4 Paws')
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(groups[1], {'4'})
+        self.assertEqual(_key_q('4').children, [('search_key__regex', r'\m4\M')])
+        self.assertEqual(_key_q('klub').children, [('search_key__contains', 'klub')])
+
+
+class CursorTests(SimpleTestCase):
+    """Курсор keyset-пагінації: round-trip і відкат на першу сторінку."""
+
+    keys = DEFAULT_CURSOR_KEYS
+
+    def test_round_trip(self):
+        token = encode_cursor([Decimal('129.50'), 42])
+        self.assertEqual(decode_cursor(token, self.keys), [Decimal('129.50'), 42])
+        self.assertNotIn('=', token)
+
+    def test_empty_and_garbage_fall_back_to_first_page(self):
+        for token in (None, '', 'not base64!', '%%%', base64.urlsafe_b64encode(b'{oops').decode()):
+            self.assertIsNone(decode_cursor(token, self.keys), token)
+
+    def test_non_finite_values_are_rejected(self):
+        for price in ('NaN', 'Infinity', '-Infinity', 'sNaN'):
+            self.assertIsNone(decode_cursor(raw_cursor([price, '1']), self.keys), price)
+
+    def test_wrong_types_are_rejected(self):
+        for values in ([129.5, 1], ['129.5', 1], ['129.5', 'x'], ['abc', '1'],
+                       ['129.5'], ['129.5', '1', '2'], {'price_eff': '1'}, '129.5'):
+            self.assertIsNone(decode_cursor(raw_cursor(values), self.keys), values)
@@ -5,7 +5,7 @@ from django.utils.text import slugify
 from django.conf import settings
 from apps.ts_ftps.ftp_client import get_reader
 from apps.ts_ftps.parser import parse_rows
-from models import Product, Product_Variant, Category, Brand, Main_Categories
+from .models import Product, Product_Variant, Category, Brand, Main_Categories
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 
@@ -1,161 +1,57 @@
 from django.shortcuts import render, get_object_or_404
-from .models import Main_Categories, Category, Product, Brand, Product_Variant
-from django.db.models import Count, Q, Prefetch
+from .models import Main_Categories, Category, Product, Brand
 from django.shortcuts import redirect
-from django.http import JsonResponse
-from decimal import Decimal
-from django.db.models import (
-    Q, F, Count, Min, Value, IntegerField,
-)
+from django.http import HttpResponse, JsonResponse
 from django.urls import reverse
-from django.db.models.functions import Coalesce
-from django.db.models import Q, Case, When, Value, IntegerField, Min
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from .listing import apply_filters, favourite_ids, render_listing
+from .search import best_match_url, suggest_items
 
+from Laskazoo.throttle import THROTTLE_MESSAGE, throttle
 
-try:
-    from apps.favourites.models import Favourite
-except Exception:
-    Favourite = None
 
+def _suggest_limited(request):
+    return JsonResponse({"items": []}, status=429)
+
+
+def _search_limited(request):
+    return HttpResponse(THROTTLE_MESSAGE, status=429)
+
+
+@throttle('search_suggest', rate=(30, 10), on_limited=_suggest_limited)
 def search_suggest(request):
     q = (request.GET.get("q") or "").strip()
     if len(q) < 2:
         return JsonResponse({"items": []})
 
+    return JsonResponse({"items": suggest_items(q)})
 
-    qs = (
-        Product.objects.filter(Q(name__icontains=q))
-        .annotate(
-            score=Case(
-                When(name__iexact=q, then=Value(100)),
-                When(name__istartswith=q, then=Value(85)),
-                default=Value(60),
-                output_field=IntegerField(),
-            ),
-
-            price=Coalesce(Min("variants__retail_price"), "retail_price"),
-        )
-        .order_by("-score")[:3]
-    )
-
-    items = []
-    for p in qs:
-        items.append({
-            "id": p.id,
-            "name": p.name,
-            "url": p.get_absolute_url() if hasattr(p, "get_absolute_url") else reverse("products:detail", args=[p.id]),
-            "image": (p.image.url if getattr(p, "image", None) else ""),
-            "price": float(p.price) if p.price is not None else None,
-        })
-    return JsonResponse({"items": items})
-
+@throttle('search', rate=(10, 10), on_limited=_search_limited)
 def quick_search(request):
     q = (request.GET.get("q") or "").strip()
     if not q:
         return redirect(reverse("products:catalog"))
 
-
-    pqs = Product.objects.filter(name__icontains=q).annotate(
-        score=Case(
-            When(name__iexact=q, then=Value(100)),
-            When(name__istartswith=q, then=Value(80)),
-            default=Value(50),
-            output_field=IntegerField(),
-        )
-    ).values("id", "score")
-
-
-    vqs = Product_Variant.objects.filter(name__icontains=q).select_related("product").annotate(
-        score=Case(
-            When(name__iexact=q, then=Value(100)),
-            When(name__istartswith=q, then=Value(75)),
-            default=Value(45),
-            output_field=IntegerField(),
-        )
-    ).values("product_id", "score")
-
-
-    best_product_id = None
-    best_score = -1
-
-    for row in pqs:
-        if row["score"] > best_score:
-            best_score = row["score"]
-            best_product_id = row["id"]
-
-    for row in vqs:
-        if row["score"] > best_score:
-            best_score = row["score"]
-            best_product_id = row["product_id"]
-
-    if best_product_id:
-        try:
-            prod = Product.objects.get(id=best_product_id)
-            return redirect(prod.get_absolute_url())
-        except Product.DoesNotExist:
-            pass
-
+    url = best_match_url(q)
+    if url:
+        return redirect(url)
 
     return redirect(f'{reverse("products:catalog")}?q={q}')
 
 def catalog(request):
     mains = Main_Categories.objects.filter(is_active=True).order_by('id')
 
-    variants_qs = (
-        Product_Variant.objects
-        .only('id', 'product_id', 'sku', 'retail_price', 'weight', 'size', 'image', 'warehouse_quantity')
-        .order_by('retail_price')
-    )
+    products_qs, filt_ctx = apply_filters(request, Product.objects.filter(is_active=True))
 
-    base_qs = (
-        Product.objects
-        .select_related('brand', 'category')
-        .prefetch_related(
-            Prefetch('variants', queryset=variants_qs, to_attr='variants_for_card')
-        )
+    return render_listing(
+        request, 'zoosvit/products/catalog.html', products_qs,
+        scope='catalog',
+        context={
+            'title': 'Каталог',
+            'mains': mains,
+            **filt_ctx,
+        },
     )
 
-    products_qs, filt_ctx = _apply_filters(request, base_qs)
-    
-    # Додаємо пагінацію
-    items_per_page = int(request.GET.get('per_page', 20))  # 20 товарів на сторінку за замовчуванням
-    if items_per_page > 100:  # обмежуємо максимум
-        items_per_page = 100
-    
-    paginator = Paginator(products_qs, items_per_page)
-    page = request.GET.get('page', 1)
-    
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
-
-    if request.user.is_authenticated:
-        fav_qs = Favourite.objects.filter(user=request.user)
-        fav_variant_ids = list(
-            fav_qs.exclude(variant__isnull=True).values_list('variant_id', flat=True)
-        )
-        fav_product_ids = list(
-            fav_qs.filter(variant__isnull=True).values_list('product_id', flat=True)
-        )
-    else:
-        fav_variant_ids = list(map(int, request.session.get('fav_variant_ids', [])))
-        fav_product_ids = list(map(int, request.session.get('fav_product_ids', [])))
-
-    ctx = {
-        'title':    'Каталог',
-        'mains':    mains,
-        'products': products,  # тепер це Page об'єкт
-        'fav_variant_ids':  list(fav_variant_ids),
-        'fav_product_ids': fav_product_ids,
-        'current_per_page': items_per_page,
-        **filt_ctx,
-    }
-    return render(request, 'zoosvit/products/catalog.html', ctx)
-
 def subcategory_list(request, main_slug):
     main = get_object_or_404(Main_Categories, slug=main_slug)
     subs = main.categories.filter(is_active=True).order_by('id')
@@ -164,60 +60,27 @@ def subcategory_list(request, main_slug):
         'categories': subs,
     })
 
+
 def category_list(request, main_slug, slug):
     category = get_object_or_404(
-        Category,
+        Category.objects.select_related('main_category'),
         slug=slug,
         main_category__slug=main_slug
     )
 
-
-    base_qs = (
-        Product.objects
-        .filter(category=category)
-        .select_related('brand', 'category')
-        .prefetch_related('variants')
+    products_qs, filt_ctx = apply_filters(
+        request, Product.objects.filter(is_active=True, category=category), category=category
     )
 
-
-    products_qs, filt_ctx = _apply_filters(request, base_qs)
-    
-    # Додаємо пагінацію
-    items_per_page = int(request.GET.get('per_page', 20))
-    if items_per_page > 100:
-        items_per_page = 100
-    
-    paginator = Paginator(products_qs, items_per_page)
-    page = request.GET.get('page', 1)
-    
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
-
-    if request.user.is_authenticated:
-        fav_qs = Favourite.objects.filter(user=request.user)
-        fav_variant_ids = list(
-            fav_qs.exclude(variant__isnull=True).values_list('variant_id', flat=True)
-        )
-        fav_product_ids = list(
-            fav_qs.filter(variant__isnull=True).values_list('product_id', flat=True)
-        )
-    else:
-        fav_variant_ids = list(map(int, request.session.get('fav_variant_ids', [])))
-        fav_product_ids = list(map(int, request.session.get('fav_product_ids', [])))
-
-    return render(request, 'zoosvit/products/category_list.html', {
-        'main':     category.main_category,
-        'category': category,
-        'products': products,
-        'fav_variant_ids': list(fav_variant_ids),
-        'fav_product_ids': fav_product_ids,
-        'current_per_page': items_per_page,
-        **filt_ctx,
-    })
+    return render_listing(
+        request, 'zoosvit/products/category_list.html', products_qs,
+        scope=f'category:{category.id}',
+        context={
+            'main':     category.main_category,
+            'category': category,
+            **filt_ctx,
+        },
+    )
 
 def product_detail(request, main_slug, slug, product_slug):
 
@@ -236,17 +99,7 @@ def product_detail(request, main_slug, slug, product_slug):
     variants = product.variants.all()
 
     # Додаємо логіку для обраних товарів
-    if request.user.is_authenticated:
-        fav_qs = Favourite.objects.filter(user=request.user)
-        fav_variant_ids = list(
-            fav_qs.exclude(variant__isnull=True).values_list('variant_id', flat=True)
-        )
-        fav_product_ids = list(
-            fav_qs.filter(variant__isnull=True).values_list('product_id', flat=True)
-        )
-    else:
-        fav_variant_ids = list(map(int, request.session.get('fav_variant_ids', [])))
-        fav_product_ids = list(map(int, request.session.get('fav_product_ids', [])))
+    fav_variant_ids, fav_product_ids = favourite_ids(request)
 
     return render(request, 'zoosvit/products/product_detail.html', {
         'main_slug': main_slug,
@@ -257,181 +110,35 @@ def product_detail(request, main_slug, slug, product_slug):
         'fav_product_ids': fav_product_ids,
     })
 
-def _apply_filters(request, base_qs):
-
-    qs = base_qs
-
-    selected_brands = request.GET.getlist('brand')
-    price_min       = request.GET.get('price_min') or None
-    price_max       = request.GET.get('price_max') or None
-    in_stock        = request.GET.get('in_stock')
-    # TODO: фільтри в бренд перенсти
-    if selected_brands:
-        qs = qs.filter(brand__brand_slug__in=selected_brands)
-
-    if price_min:
-        qs = qs.filter(retail_price__gte=price_min)
-    if price_max:
-        qs = qs.filter(retail_price__lte=price_max)
-    if in_stock:
-
-        qs = qs.filter(variants__warehouse_quantity__gt=0).distinct()
-
-
-    brands_agg = (
-        qs.values('brand__brand_slug', 'brand__name')
-          .annotate(count=Count('id'))
-          .order_by('brand__name')
-    )
-
-
-    brands_ctx = [
-        {
-            'slug':    b['brand__brand_slug'],
-            'name':  b['brand__name'],
-            'count': b['count'],
-            'checked': b['brand__brand_slug'] in selected_brands
-        }
-        for b in brands_agg if b['brand__brand_slug']
-    ]
-
-    return qs, {
-        'brands':    brands_ctx,
-        'price_min': price_min or '',
-        'price_max': price_max or '',
-        'in_stock':  bool(in_stock),
-        'selected_brands': selected_brands
-    }
-
 def catalog_by_brand(request, brand_slug):
-
     cur_brand = get_object_or_404(Brand, brand_slug__iexact=brand_slug)
-
-
-    picked_brands = request.GET.getlist('brand')           # може бути кілька
-    price_min     = (request.GET.get('price_min') or '').strip()
-    price_max     = (request.GET.get('price_max') or '').strip()
-    in_stock      = request.GET.get('in_stock') == '1'
-
-
-
-    base = Product.objects.filter(is_active=True)
-    if picked_brands:
-        base = base.filter(brand__brand_slug__in=picked_brands)
-    else:
-        base = base.filter(brand=cur_brand)
-
-
-    products_qs = (base
-        .select_related('brand', 'category')
-        .annotate(min_var_price=Min('variants__retail_price'))
-        .annotate(price_eff=Coalesce('min_var_price', F('retail_price')))
+    products_qs, filt_ctx = apply_filters(
+        request, Product.objects.filter(is_active=True), brand=cur_brand,
     )
-
-
-    if price_min:
-        try: products_qs = products_qs.filter(price_eff__gte=Decimal(price_min))
-        except Exception: pass
-    if price_max:
-        try: products_qs = products_qs.filter(price_eff__lte=Decimal(price_max))
-        except Exception: pass
-
-
-    if in_stock:
-        products_qs = products_qs.filter(
-            Q(variants__warehouse_quantity__gt=0) |
-            Q(warehouse_quantity__gt=0)
-        )
-
-    products_qs = products_qs.distinct()
-    
-    # Додаємо пагінацію
-    items_per_page = int(request.GET.get('per_page', 20))
-    if items_per_page > 100:
-        items_per_page = 100
-    
-    paginator = Paginator(products_qs, items_per_page)
-    page = request.GET.get('page', 1)
-    
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
-
-
-
-
-    sidebar = (Product.objects.filter(is_active=True)
-        .annotate(min_var_price=Min('variants__retail_price'))
-        .annotate(price_eff=Coalesce('min_var_price', F('retail_price')))
+    return render_listing(
+        request, 'zoosvit/products/product_list.html', products_qs,
+        scope=f'brand:{cur_brand.id}',
+        context={
+            'title': f'Бренд: {cur_brand.name}',
+            **filt_ctx,
+        },
     )
-    if price_min:
-        try: sidebar = sidebar.filter(price_eff__gte=Decimal(price_min))
-        except Exception: pass
-    if price_max:
-        try: sidebar = sidebar.filter(price_eff__lte=Decimal(price_max))
-        except Exception: pass
-    if in_stock:
-        sidebar = sidebar.filter(
-            Q(variants__warehouse_quantity__gt=0) |
-            Q(warehouse_quantity__gt=0)
-        )
-
-
-    sidebar = sidebar.filter(brand__country_slug__iexact=cur_brand.country_slug)
-
-    agg = (sidebar.values('brand__brand_slug', 'brand__name')
-                 .annotate(count=Count('id'))
-                 .order_by('brand__name'))
-
-    picked_set = set(picked_brands) if picked_brands else {cur_brand.brand_slug}
-    brands_ctx = [
-        {
-            'slug':  row['brand__brand_slug'],
-            'name':  row['brand__name'],
-            'count': row['count'],
-            'checked': row['brand__brand_slug'] in picked_set
-        }
-        for row in agg if row['brand__brand_slug']
-    ]
-
-    return render(request, 'zoosvit/products/product_list.html', {
-        'title':     f'Бренд: {cur_brand.name}',
-        'products':  products,
-        'brands':    brands_ctx,
-        'price_min': price_min,
-        'price_max': price_max,
-        'in_stock':  in_stock,
-        'current_per_page': items_per_page,
-    })
 
 def catalog_by_country(request, country_slug):
     country_brands = Brand.objects.filter(country_slug__iexact=country_slug)
-    products_qs = (Product.objects
-                .filter(brand__in=country_brands)
-                .select_related('brand', 'category'))
-    
-    # Додаємо пагінацію
-    items_per_page = int(request.GET.get('per_page', 20))
-    if items_per_page > 100:
-        items_per_page = 100
-    
-    paginator = Paginator(products_qs, items_per_page)
-    page = request.GET.get('page', 1)
-    
-    try:
-        products = paginator.page(page)
-    except PageNotAnInteger:
-        products = paginator.page(1)
-    except EmptyPage:
-        products = paginator.page(paginator.num_pages)
-        
-    title = f"Країна: {country_brands.first().country if country_brands else country_slug}"
-    return render(request, 'zoosvit/products/product_list.html', {
-        'title': title,
-        'products': products,
-        'brands': country_brands.annotate(count=Count('products')),
-        'current_per_page': items_per_page,
-    })
+    products_qs, filt_ctx = apply_filters(
+        request,
+        Product.objects.filter(is_active=True, brand__country_slug__iexact=country_slug),
+        country_slug=country_slug,
+    )
+
+    first_brand = country_brands.first()
+    title = f"Країна: {first_brand.country if first_brand else country_slug}"
+    return render_listing(
+        request, 'zoosvit/products/product_list.html', products_qs,
+        scope=f'country:{country_slug.lower()}',
+        context={
+            'title': title,
+            **filt_ctx,
+        },
+    )
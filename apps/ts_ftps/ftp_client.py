@@ -1,5 +1,5 @@
 import io, ssl
-from ftplib import FTP, FTP_TLS
+from ftplib import FTP, FTP_TLS, error_perm
 
 class ImplicitFTP_TLS(FTP_TLS):
     """FTP over TLS (implicit, порт 990): TLS встановлюється одразу після TCP connect."""
@@ -69,15 +69,58 @@ class SimpleFTP:
             ftps.set_pasv(self.passive)
             return ftps
 
+    @staticmethod
+    def _retr(ftp, remote_path, write=None):
+        if write is not None:
+            ftp.retrbinary(f"RETR {remote_path}", write)
+            return None
+        bio = io.BytesIO()
+        ftp.retrbinary(f"RETR {remote_path}", bio.write)
+        return bio.getvalue()
+
+    @staticmethod
+    def _stat(ftp, remote_path):
+        """(size, mdtm) файлу; None — якщо сервер не підтримує SIZE / MDTM."""
+        try:
+            ftp.voidcmd("TYPE I")
+            size = ftp.size(remote_path)
+        except error_perm:
+            size = None
+        try:
+            resp = ftp.sendcmd(f"MDTM {remote_path}")
+            mdtm = resp.split()[-1] if resp.startswith("213") else None
+        except error_perm:
+            mdtm = None
+        return size, mdtm
+
+    def _close(self, ftp):
+        try:
+            ftp.quit()
+        except Exception:
+            ftp.close()
+
     def read_bytes(self, remote_path: str) -> bytes:
         remote_path = remote_path.replace("\\", "/")
         ftp = self._open()
         try:
-            bio = io.BytesIO()
-            ftp.retrbinary(f"RETR {remote_path}", bio.write)
-            return bio.getvalue()
+            return self._retr(ftp, remote_path)
+        finally:
+            self._close(ftp)
+
+    def download_if_changed(self, remote_path: str, write, known=None):
+        """
+        В одному з'єднанні: SIZE/MDTM, і RETR — лише якщо вони відрізняються
+        від known=(size, mdtm) попереднього прогону (або сервер їх не віддав).
+        Блоки RETR передаються у write() по мірі надходження (файл у пам'яті
+        цілком не тримається). Повертає ((size, mdtm), чи було завантаження).
+        """
+        remote_path = remote_path.replace("\\", "/")
+        ftp = self._open()
+        try:
+            stat = self._stat(ftp, remote_path)
+            if known and None not in stat and tuple(known) == stat:
+                return stat, False
+            self._retr(ftp, remote_path, write)
+            return stat, True
         finally:
-            try:
-                ftp.quit()
-            except Exception:
-                ftp.close()
+            self._close(ftp)
@@ -11,11 +11,17 @@ class Command(BaseCommand):
         g.add_argument('--append', action='store_true',
                        help='Лише створювати нові, існуючі НЕ оновлювати')
         # за замовчуванням буде upsert
+        parser.add_argument('--force', action='store_true',
+                            help='Обробити файл, навіть якщо він не змінився з попереднього прогону')
 
     def handle(self, *args, **options):
         mode = 'replace' if options['replace'] else ('append' if options['append'] else 'upsert')
-        res = import_ts_goods(mode=mode)
+        res = import_ts_goods(mode=mode, force=options['force'])
+        if res.get('unchanged'):
+            self.stdout.write("Файл не змінився з попереднього прогону — пропускаємо")
+            return
         self.stdout.write(self.style.SUCCESS(
             f"OK mode={mode}: total={res['total']} "
-            f"created={res.get('created',0)} updated={res.get('updated',0)} skipped={res.get('skipped',0)}"
+            f"created={res.get('created',0)} updated={res.get('updated',0)} skipped={res.get('skipped',0)} "
+            f"removed={res.get('removed',0)}"
         ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ts_ftps', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tsgoods',
+            name='row_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+    ]
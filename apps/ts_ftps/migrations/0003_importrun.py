@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ts_ftps', '0002_tsgoods_row_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('sync_ts_direct', 'Синхронізація каталогу'), ('import_ts_goods', 'Імпорт у ts_goods'), ('import_from_source', 'Імпорт товарів')], max_length=32)),
+                ('file_path', models.CharField(max_length=512)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+                ('mdtm', models.CharField(blank=True, default='', max_length=32)),
+                ('digest', models.CharField(max_length=64)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Прогін імпорту Торгсофт',
+                'verbose_name_plural': 'Прогони імпорту Торгсофт',
+                'db_table': 'ts_import_run',
+                'indexes': [models.Index(fields=['source', '-created_at'], name='ts_import_run_source')],
+            },
+        ),
+    ]
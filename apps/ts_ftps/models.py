@@ -15,6 +15,8 @@ class TSGoods(models.Model):
     closeout = models.BooleanField(default=False)
     equal_sale_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     equal_wholesale_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # sha1 рядка файлу (parser.row_hash) — незмінні рядки імпорт пропускає
+    row_hash = models.CharField(max_length=40, blank=True, default="", editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -25,3 +27,37 @@ class TSGoods(models.Model):
 
     def __str__(self):
         return f"{self.good_id} — {self.good_name or ''}".strip()
+
+
+class ImportRun(models.Model):
+    """
+    Успішний прогін імпорту / синхронізації з відбитком файлу TRS.
+    Наступний прогін того самого source порівнює SIZE/MDTM (до RETR)
+    і sha256 вмісту (до парсингу) — незмінений файл не обробляється.
+    """
+    SOURCE_SYNC = "sync_ts_direct"
+    SOURCE_TS_GOODS = "import_ts_goods"
+    SOURCE_PRODUCTS = "import_from_source"
+    SOURCE_CHOICES = [
+        (SOURCE_SYNC, "Синхронізація каталогу"),
+        (SOURCE_TS_GOODS, "Імпорт у ts_goods"),
+        (SOURCE_PRODUCTS, "Імпорт товарів"),
+    ]
+
+    source = models.CharField(max_length=32, choices=SOURCE_CHOICES)
+    file_path = models.CharField(max_length=512)
+    size = models.BigIntegerField(null=True, blank=True)
+    # відповідь MDTM (YYYYMMDDHHMMSS, UTC) або mtime_ns локального файлу
+    mdtm = models.CharField(max_length=32, blank=True, default="")
+    digest = models.CharField(max_length=64)
+    result = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Прогін імпорту Торгсофт"
+        verbose_name_plural = "Прогони імпорту Торгсофт"
+        db_table = "ts_import_run"
+        indexes = [models.Index(fields=["source", "-created_at"], name="ts_import_run_source")]
+
+    def __str__(self):
+        return f"{self.source} {self.created_at:%Y-%m-%d %H:%M} ({self.digest[:8]})"
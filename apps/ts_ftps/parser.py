@@ -1,4 +1,4 @@
-import csv, io, re
+import csv, hashlib, io, itertools, json, re
 from decimal import Decimal, InvalidOperation
 from django.conf import settings
 
@@ -74,6 +74,16 @@ def _to_bool(x):
     s = str(x or "").strip().lower()
     return s in {"1","true","yes","так","y","t","да","истина"}
 
+# ключ із хешем вмісту рядка: незмінні між вивантаженнями рядки
+# (той самий хеш, що збережений у TSGoods.row_hash / Product.ts_hash) пропускаються
+HASH_KEY = "row_hash"
+
+def row_hash(data):
+    """Стабільний sha1 розпарсеного рядка (порядок колонок у файлі не важливий)."""
+    payload = {k: v for k, v in data.items() if k != HASH_KEY}
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
 def sniff_delimiter(text):
     force = settings.TS_SYNC["FILE"].get("DELIMITER", "auto")
     if force != "auto":
@@ -84,11 +94,37 @@ def sniff_delimiter(text):
     except Exception:
         return ";"
 
-def parse_rows(raw_bytes):
+SNIFF_SIZE = 4096
+
+def _text_lines(source, enc):
+    """
+    Рядки тексту з bytes або бінарного file-like (spooled-завантаження,
+    відкритий файл) — інкрементальний декодер, без копії всього файлу в str.
+    Повертає (роздільник, ітератор рядків, TextIOWrapper).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    text = io.TextIOWrapper(source, encoding=enc, errors="replace", newline="")
+    # зразок для sniff — дочитуємо до кінця рядка, щоб не розрізати запис
+    sample = text.read(SNIFF_SIZE) + text.readline()
+    lines = itertools.chain(io.StringIO(sample, newline=""), text)
+    return sniff_delimiter(sample), lines, text
+
+def parse_rows(source):
+    """
+    Ліниво yield-ить dict на кожен рядок файлу.
+    source — bytes або бінарний file-like (читається потоково).
+    """
     enc = settings.TS_SYNC["FILE"].get("ENCODING", "utf-8")
-    text = raw_bytes.decode(enc, errors="replace")
-    delim = sniff_delimiter(text)
-    rdr = csv.DictReader(io.StringIO(text), delimiter=delim)
+    delim, lines, text = _text_lines(source, enc)
+    try:
+        yield from _parse_lines(lines, delim)
+    finally:
+        # файл закриває власник source, не обгортка
+        text.detach()
+
+def _parse_lines(lines, delim):
+    rdr = csv.DictReader(lines, delimiter=delim)
     for row in rdr:
         data = {}
         for hdr, val in row.items():
@@ -107,4 +143,19 @@ def parse_rows(raw_bytes):
                 data[key] = (val or "").strip()
         # вимагаємо принаймні good_id
         if data.get("good_id"):
+            data[HASH_KEY] = row_hash(data)
             yield data
+
+def iter_batches(rows, size):
+    """Потік рядків -> dict good_id -> рядок по size штук (дублікати в пачці — останній)."""
+    batch = {}
+    for row in rows:
+        good_id = str(row.get("good_id") or "").strip()
+        if not good_id:
+            continue
+        batch[good_id] = row
+        if len(batch) >= size:
+            yield batch
+            batch = {}
+    if batch:
+        yield batch
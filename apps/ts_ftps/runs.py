@@ -0,0 +1,110 @@
+"""
+Відбиток файлу TRS між прогонами імпорту.
+
+Файл перезаписується Торгсофтом рідше, ніж спрацьовує таймер systemd
+чи TorgsoftNotifyView, тож кожен source (ImportRun.SOURCE_*) спершу
+порівнює файл з останнім успішним прогоном:
+
+1) SIZE/MDTM в тому ж FTP-з'єднанні (локально — os.stat) — збіг: без RETR;
+2) sha256 вмісту до парсингу — збіг: без парсингу й записів у БД
+   (лише оновлюється MDTM останнього прогону, щоб наступного разу
+   спрацював крок 1).
+
+fetch_if_changed() повертає SourceFile або None (файл не змінився);
+record_run() викликається після успішної обробки — прогін, що впав,
+не записується і наступний запуск обробить файл повністю.
+
+Вміст не тримається в пам'яті цілком: FTP-завантаження пишеться блоками
+в SpooledTemporaryFile (понад SPOOL_MAX_SIZE — на диск), локальний файл
+читається напряму; sha256 рахується по блоках. SourceFile.file —
+бінарний file-like для parser.parse_rows; закривається через `with src:`.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from .models import ImportRun
+from .utils import get_reader
+
+
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SourceFile:
+    path: str
+    file: BinaryIO
+    size: Optional[int]
+    mdtm: Optional[str]
+    digest: str
+    # (mode, client, incoming_dir, photos_dir, file_name) з get_reader()
+    reader: tuple
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+def _local_stat(path):
+    # локально — mtime у наносекундах: MDTM має точність до секунди
+    st = os.stat(path)
+    return st.st_size, str(st.st_mtime_ns)
+
+
+def last_run(source):
+    return ImportRun.objects.filter(source=source).order_by("-created_at", "-pk").first()
+
+
+def fetch_if_changed(source, force=False) -> Optional[SourceFile]:
+    reader = get_reader()
+    mode, client, incoming_dir, _photos_dir, file_name = reader
+    path = f"{incoming_dir.rstrip('/')}/{file_name}"
+
+    last = None if force else last_run(source)
+    known = (last.size, last.mdtm) if last else None
+
+    sha = hashlib.sha256()
+    if mode in ("ftp", "ftps"):
+        f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+        def write(block):
+            sha.update(block)
+            f.write(block)
+
+        try:
+            (size, mdtm), downloaded = client.download_if_changed(path, write, known)
+        except BaseException:
+            f.close()
+            raise
+        if not downloaded:
+            f.close()
+            return None
+    else:
+        path = os.path.join(incoming_dir, file_name)
+        size, mdtm = _local_stat(path)
+        if known == (size, mdtm):
+            return None
+        f = open(path, "rb")
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+            sha.update(block)
+    f.seek(0)
+
+    digest = sha.hexdigest()
+    if last and last.digest == digest:
+        f.close()
+        # вміст той самий (файл перезаписано без змін) — запам'ятати новий MDTM
+        ImportRun.objects.filter(pk=last.pk).update(size=size, mdtm=mdtm or "")
+        return None
+    return SourceFile(path=path, file=f, size=size, mdtm=mdtm, digest=digest, reader=reader)
+
+
+def record_run(source, file: SourceFile, result=None):
+    return ImportRun.objects.create(
+        source=source, file_path=file.path, size=file.size, mdtm=file.mdtm or "",
+        digest=file.digest, result=result or {},
+    )
@@ -1,12 +1,12 @@
-import os
 from django.apps import apps
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from django.db import transaction  # <-- додали
-from .utils import get_reader
-from .parser import parse_rows
-from .models import TSGoods  # якщо сирі дані пишемо у свою таблицю
+from django.db import connection, transaction  # <-- додали
+from django.utils import timezone
+from .parser import iter_batches, parse_rows
+from .models import ImportRun, TSGoods  # якщо сирі дані пишемо у свою таблицю
+from .runs import fetch_if_changed, record_run
 
 def get_product_model():
     """
@@ -56,99 +56,124 @@ def upsert_products(items, photos_reader=None, photos_dir=None):
         upserted += 1
     return upserted
 
-def import_from_source():
+def import_from_source(force=False):
     """
     Якщо потрібно імпортувати у свою модель Product (НЕ сирі дані).
+    Незмінений з попереднього прогону файл не завантажується (див. runs).
     """
-    mode, sftp, incoming_dir, photos_dir, file_name = get_reader()
-    trs_path = f"{incoming_dir.rstrip('/')}/{file_name}"
+    src = fetch_if_changed(ImportRun.SOURCE_PRODUCTS, force=force)
+    if src is None:
+        return {"total": 0, "upserted": 0, "unchanged": True}
+
+    mode, sftp, _incoming_dir, photos_dir, _file_name = src.reader
+    with src:
+        items = parse_rows(src.file)  # потоком, без списку в пам'яті
+        if mode == "sftp":
+            upserted = upsert_products(items, photos_reader=sftp, photos_dir=photos_dir)
+        else:
+            upserted = upsert_products(items, photos_reader=None, photos_dir=None)
+
+    # upsert_products обробляє кожен рядок
+    res = {"total": upserted, "upserted": upserted}
+    record_run(ImportRun.SOURCE_PRODUCTS, src, res)
+    return res
+
+# колонки TSGoods, які заповнюються з файлу (решту полів парсера таблиця не має)
+TS_GOODS_FIELDS = [
+    f.attname for f in TSGoods._meta.concrete_fields
+    if f.attname not in ("id", "good_id", "created_at", "updated_at")
+]
+TS_GOODS_BATCH_SIZE = 1000
+
 
-    if mode == "sftp":
-        raw = sftp.read_bytes(trs_path)
-        items = list(parse_rows(raw))  # <-- робимо список (інакше немає len)
-        upserted = upsert_products(items, photos_reader=sftp, photos_dir=photos_dir)
+def _ts_goods_row(good_id, rec, now):
+    row = [good_id]
+    for name in TS_GOODS_FIELDS:
+        field = TSGoods._meta.get_field(name)
+        value = rec[name] if name in rec else field.get_default()
+        row.append(field.get_db_prep_save(value, connection))
+    return row + [now, now]
+
+
+def _upsert_ts_goods_sql(rows, update):
+    """
+    INSERT ... ON CONFLICT (good_id) пачкою.
+    update=True  — змінені (за row_hash) рядки оновлюються, незмінені не чіпаються;
+    update=False — існуючі пропускаються (DO NOTHING).
+    RETURNING повертає good_id лише вставлених / оновлених рядків; xmax = 0 — вставлений.
+    """
+    table = connection.ops.quote_name(TSGoods._meta.db_table)
+    columns = ["good_id", *TS_GOODS_FIELDS, "created_at", "updated_at"]
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    values = ", ".join([placeholders] * len(rows))
+    if update:
+        conflict = "DO UPDATE SET " + ", ".join(
+            f"{connection.ops.quote_name(c)} = EXCLUDED.{connection.ops.quote_name(c)}"
+            for c in [*TS_GOODS_FIELDS, "updated_at"]
+        ) + f" WHERE {table}.row_hash IS DISTINCT FROM EXCLUDED.row_hash"
     else:
-        local = os.path.join(incoming_dir, file_name)
-        with open(local, "rb") as f:
-            raw = f.read()
-        items = list(parse_rows(raw))
-        upserted = upsert_products(items, photos_reader=None, photos_dir=None)
+        conflict = "DO NOTHING"
+    return f"""
+        INSERT INTO {table} ({", ".join(connection.ops.quote_name(c) for c in columns)})
+        VALUES {values}
+        ON CONFLICT (good_id) {conflict}
+        RETURNING good_id, (xmax = 0)
+    """, [value for row in rows for value in row]
 
-    return {"total": len(items), "upserted": upserted}
 
 @transaction.atomic
-def import_ts_goods(mode: str = 'upsert'):
+def import_ts_goods(mode: str = 'upsert', force: bool = False):
     """
     mode:
-      - 'upsert'  (за замовч.) update_or_create по good_id
+      - 'upsert'  (за замовч.) нові створюються, змінені оновлюються по good_id
       - 'replace' видалити всі рядки і залити з файлу
       - 'append'  тільки створювати нові, існуючі пропускати
+
+    Файл читається потоково; кожна пачка — один
+    INSERT ... ON CONFLICT (good_id) DO UPDATE (upsert, replace) / DO NOTHING (append);
+    незмінені рядки (parser.row_hash = TSGoods.row_hash) не оновлюються.
+    Кількість створених / оновлених повертає сама БД (RETURNING).
+    Якщо файл не змінився з попереднього прогону (runs) — нічого не робиться.
     """
     mode = mode.lower().strip()
     if mode not in {'upsert', 'replace', 'append'}:
         mode = 'upsert'
 
-    # 1) зчитати файл (ftp/ftps/local)
-    source_mode, client, incoming_dir, _photos_dir, file_name = get_reader()
-    trs_path = f"{incoming_dir.rstrip('/')}/{file_name}"
-
-    if source_mode in ("ftp", "ftps"):
-        raw = client.read_bytes(trs_path)
-    else:
-        with open(os.path.join(incoming_dir, file_name), "rb") as f:
-            raw = f.read()
-
-    # 2) розпарсити всі рядки одразу (щоб мати total)
-    items = [dict(r) for r in parse_rows(raw)]  # копії dict на всякий
-    total = len(items)
-    created = updated = skipped = 0
+    # 1) зчитати файл (ftp/ftps/local), якщо він змінився
+    src = fetch_if_changed(ImportRun.SOURCE_TS_GOODS, force=force)
+    if src is None:
+        return {"total": 0, "created": 0, "updated": 0, "skipped": 0, "removed": 0, "unchanged": True}
 
-    # 3) режими
+    # 2) потоково: парсинг і запис пачками по TS_GOODS_BATCH_SIZE
     if mode == 'replace':
-        # повна заміна
+        # повна заміна: очистити і залити тим самим upsert
         TSGoods.objects.all().delete()
-        objs = []
-        for rec in items:
-            rec = dict(rec)
-            good_id = str(rec.pop("good_id"))
-            objs.append(TSGoods(good_id=good_id, **rec))
-        if objs:
-            TSGoods.objects.bulk_create(objs, batch_size=1000)
-        created = len(objs)
-        return {"total": total, "created": created, "updated": 0, "skipped": 0}
-
-    if mode == 'append':
-        # лише створюємо; існуючі з таким good_id пропускаємо
-        for rec in items:
-            rec = dict(rec)
-            good_id = str(rec.pop("good_id"))
-            obj, was_created = TSGoods.objects.get_or_create(good_id=good_id, defaults=rec)
-            if was_created:
-                created += 1
-            else:
-                skipped += 1
-        return {"total": total, "created": created, "updated": 0, "skipped": skipped}
-
-    # upsert (оновити або створити)
-    for rec in items:
-        rec = dict(rec)
-
-        good_id = str(rec.pop("good_id", "")).strip()
-        if not good_id:
-            # якщо раптом попався пустий good_id — пропускаємо
-            continue
-
-        # ВАЖЛИВО: не даємо Django вставити чужий PK
-        safe_defaults = {k: v for k, v in rec.items() if k not in ("id", "pk")}
-
-        obj, was_created = TSGoods.objects.update_or_create(
-            good_id=good_id,
-            defaults=safe_defaults,
-        )
-
-        if was_created:
-            created += 1
-        else:
-            updated += 1
 
-    return {"total": total, "created": created, "updated": updated, "skipped": 0}
+    table = connection.ops.quote_name(TSGoods._meta.db_table)
+    # good_id може повторитися в різних пачках — рахуємо унікальні id,
+    # а не рядки пачок; повторно оновлений створений рядок лишається створеним
+    seen, created_ids, updated_ids = set(), set(), set()
+    now = timezone.now()
+    with src, connection.cursor() as cursor:
+        for batch in iter_batches(parse_rows(src.file), TS_GOODS_BATCH_SIZE):
+            seen.update(batch)
+            rows = [_ts_goods_row(good_id, rec, now) for good_id, rec in batch.items()]
+            cursor.execute(*_upsert_ts_goods_sql(rows, update=(mode != 'append')))
+            for good_id, inserted in cursor.fetchall():
+                (created_ids if inserted else updated_ids).add(good_id)
+        total = len(seen)
+        created = len(created_ids)
+        updated = len(updated_ids - created_ids)
+
+        # рядки таблиці, яких уже немає у файлі (лише для звіту; після upsert
+        # кожен good_id файлу є в таблиці)
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        removed = max(0, cursor.fetchone()[0] - total)
+    skipped = total - created - updated
+
+    res = {
+        "total": total, "created": created, "updated": updated,
+        "skipped": skipped, "removed": removed,
+    }
+    record_run(ImportRun.SOURCE_TS_GOODS, src, res)
+    return res
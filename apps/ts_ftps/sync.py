@@ -0,0 +1,300 @@
+"""
+Рушій синхронізації Product / Product_Variant з файлом Торгсофта.
+
+Рядки файлу приходять потоком (parser.parse_rows) і обробляються пачками
+по SYNC_BATCH_SIZE good_id — пам'ять не залежить від розміру файлу:
+1) з БД для пачки читаються лише порівнювані колонки (.values()),
+   без моделей, save() і сигналів;
+2) значення з файлу порівнюються в пам'яті, зміни групуються
+   за набором змінених полів;
+3) запис — bulk_update на кожен набір полів, усі пачки в одній транзакції.
+
+Slug перебудовується лише для записів, у яких змінились його складові
+(name / sku / barcode; для варіанта — ще й назва товару), з перевіркою
+унікальності і в БД, і серед slug-ів, виданих у цьому ж прогоні.
+
+Рядки, хеш яких (parser.row_hash) збігається зі збереженим ts_hash,
+не порівнюються взагалі — між вивантаженнями змінюється лише невелика
+частина файлу. full=True ігнорує хеші (напр., після ручних правок в адмінці).
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import transaction
+
+from apps.products.models import (
+    Product, Product_Variant, product_slug_base, variant_slug_base,
+)
+from apps.ts_ftps.parser import HASH_KEY, iter_batches
+
+SYNC_BATCH_SIZE = 1000
+
+# поля, які бере синхронізація (однакові для Product і Product_Variant)
+SYNC_FIELDS = (
+    'barcode', 'sku', 'name',
+    'retail_price', 'warehouse_quantity', 'original_bag_weight_kg',
+)
+SLUG_SOURCE_FIELDS = {'name', 'sku', 'barcode'}
+VARIANT_FIELDS = ('product_id', 'weight', 'color', 'size')
+
+
+def money(x, default='0.00') -> Decimal:
+    """
+    Безпечно конвертує значення в Decimal(2):
+    - приймає 19, 19.5, '19,50', ' 1 234,56 ', None
+    - повертає Decimal із двома знаками після коми
+    """
+    if x is None:
+        s = ''
+    else:
+        s = str(x).strip().replace('\xa0', '').replace(' ', '')
+    if not s:
+        s = default
+    # якщо є кома і немає крапки — це десятковий роздільник
+    if s.count(',') == 1 and s.count('.') == 0:
+        s = s.replace(',', '.')
+    # прибрати тисячні роздільники (на всяк, якщо "1,234.56")
+    if s.count(',') > 0 and s.count('.') > 0:
+        s = s.replace(',', '')
+    try:
+        d = Decimal(s)
+    except (InvalidOperation, ValueError):
+        d = Decimal(default)
+    return d.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def as_int(x) -> int:
+    try:
+        return int(money(x))
+    except Exception:
+        try:
+            return int(x or 0)
+        except Exception:
+            return 0
+
+
+def ts_values(ts):
+    """Цільові значення полів з рядка файлу (ідентифікатори — лише непорожні)."""
+    values = {}
+    for key, source in (('barcode', 'barcode'), ('sku', 'articul'), ('name', 'description')):
+        value = (ts.get(source) or '').strip()
+        if value:
+            values[key] = value
+
+    values['retail_price'] = money(ts.get('wholesale_price'))
+    values['warehouse_quantity'] = as_int(ts.get('warehouse_quantity'))
+
+    # "На вагу" по good_type_full: вагова -> 0, інакше None (порожньо)
+    ts_prod_coll = (ts.get('good_type_full') or '').strip()
+    tokens = [t.strip().lower() for t in ts_prod_coll.split(',') if t.strip()]
+    is_weighted = any(t == 'на вагу' for t in tokens) or ('на вагу' in ts_prod_coll.lower())
+    values['original_bag_weight_kg'] = Decimal('0') if is_weighted else None
+    return values
+
+
+@dataclass
+class SyncResult:
+    rows: int = 0
+    updated: int = 0
+    # класифікація рядків: хеш збігся / рядок є у файлі, але не в каталозі /
+    # запис каталогу з torgsoft_id, якого вже немає у файлі
+    unchanged: int = 0
+    added: int = 0
+    removed: int = 0
+    product_ids: set = field(default_factory=set)
+    preview: list = field(default_factory=list)
+
+
+class _SlugAllocator:
+    """unique_slugify для пачки: враховує і БД, і slug-и, видані в цьому прогоні."""
+
+    def __init__(self, model):
+        self.model = model
+        self.taken = set()
+
+    def allocate(self, base, pk):
+        base = base or 'item'
+        slug, i = base, 2
+        while slug in self.taken or self.model.objects.filter(slug=slug).exclude(pk=pk).exists():
+            slug = f'{base}-{i}'
+            i += 1
+        self.taken.add(slug)
+        return slug
+
+
+def _columns(extra_fields=()):
+    return ('pk', 'torgsoft_id', 'slug', 'ts_hash', *SYNC_FIELDS, *extra_fields)
+
+
+def _diff(model, ts_by_good_id, extra_fields, result, matched, full):
+    """
+    (row, changes) для записів пачки, рядок яких у файлі змінився.
+    changes може містити лише ts_hash — значення ті самі, оновлюється хеш.
+    """
+    rows = (model.objects
+            .filter(torgsoft_id__in=list(ts_by_good_id))
+            .order_by()
+            .values(*_columns(extra_fields)))
+    for row in rows:
+        good_id = str(row['torgsoft_id']).strip()
+        ts = ts_by_good_id[good_id]
+        matched.add(good_id)
+        new_hash = ts.get(HASH_KEY) or ''
+        if new_hash and new_hash == row['ts_hash'] and not full:
+            result.unchanged += 1
+            continue
+        changes = {
+            name: value for name, value in ts_values(ts).items()
+            if row[name] != value
+        }
+        if new_hash != row['ts_hash']:
+            changes['ts_hash'] = new_hash
+        if changes:
+            yield row, changes
+
+
+def _apply(model, diffs):
+    """bulk_update окремо для кожного набору змінених полів."""
+    groups = defaultdict(list)
+    for pk, changes in diffs:
+        groups[tuple(sorted(changes))].append(model(pk=pk, **changes))
+    for fields, objs in groups.items():
+        model.objects.bulk_update(objs, fields, batch_size=SYNC_BATCH_SIZE)
+
+
+def _is_update(changes):
+    """Чи є зміни, крім самого хешу."""
+    return len(changes) > ('ts_hash' in changes)
+
+
+def _preview(result, label, row, changes, limit):
+    if len(result.preview) < limit:
+        result.preview.append(
+            f"[{label}] id={row['torgsoft_id']}: " +
+            ", ".join(f"{f} {row.get(f)} → {new}" for f, new in changes.items() if f != 'ts_hash')
+        )
+
+
+def _with_torgsoft_id(model):
+    return model.objects.exclude(torgsoft_id__isnull=True).exclude(torgsoft_id='')
+
+
+class _CatalogSync:
+    """Стан прогону між пачками: лічильники, видані slug-и, нові назви товарів."""
+
+    def __init__(self, products, variants, dry, full, preview_limit):
+        self.products = products
+        self.variants = variants
+        self.dry = dry
+        self.full = full
+        self.preview_limit = preview_limit
+        self.result = SyncResult()
+        self.product_slugs = _SlugAllocator(Product)
+        self.variant_slugs = _SlugAllocator(Product_Variant)
+        # pk -> нова назва перейменованих товарів (для slug варіантів у наступних
+        # пачках; у dry-run у БД її немає)
+        self.new_names = {}
+        # скільки записів кожної моделі знайшлось у файлі (для removed)
+        self.matched_count = defaultdict(int)
+
+    def run(self, ts_rows):
+        for batch in iter_batches(ts_rows, SYNC_BATCH_SIZE):
+            self.result.rows += len(batch)
+            matched = {Product: set(), Product_Variant: set()}
+            product_diffs, variant_diffs = self._batch(batch, matched)
+            for model, good_ids in matched.items():
+                self.matched_count[model] += len(good_ids)
+            self.result.added += len(batch.keys() - matched[Product] - matched[Product_Variant])
+            if not self.dry:
+                _apply(Product, product_diffs)
+                _apply(Product_Variant, variant_diffs)
+
+        for model, enabled in ((Product, self.products), (Product_Variant, self.variants)):
+            if enabled:
+                self.result.removed += _with_torgsoft_id(model).count() - self.matched_count[model]
+        return self.result
+
+    def _batch(self, ts_by_good_id, matched):
+        result = self.result
+        product_diffs, variant_diffs = [], []
+        renamed_products = set()
+
+        if self.products:
+            for row, changes in _diff(Product, ts_by_good_id, (), result,
+                                      matched[Product], self.full):
+                if SLUG_SOURCE_FIELDS & changes.keys():
+                    merged = {**row, **changes}
+                    slug = self.product_slugs.allocate(product_slug_base(
+                        merged['name'], merged['sku'], merged['torgsoft_id'], merged['barcode'],
+                    ), row['pk'])
+                    if slug != row['slug']:
+                        changes['slug'] = slug
+                if 'name' in changes:
+                    renamed_products.add(row['pk'])
+                    self.new_names[row['pk']] = changes['name']
+                product_diffs.append((row['pk'], changes))
+                if _is_update(changes):
+                    result.updated += 1
+                    result.product_ids.add(row['pk'])
+                    _preview(result, 'Product', row, changes, self.preview_limit)
+
+        if not self.variants:
+            return product_diffs, variant_diffs
+
+        pending = list(_diff(Product_Variant, ts_by_good_id, VARIANT_FIELDS,
+                             result, matched[Product_Variant], self.full))
+        # варіанти перейменованих товарів, які самі не змінились, теж отримують новий slug
+        seen = {row['pk'] for row, _ in pending}
+        if renamed_products:
+            pending += [
+                (row, {}) for row in (
+                    Product_Variant.objects
+                    .filter(product_id__in=renamed_products).exclude(pk__in=seen)
+                    .values(*_columns(VARIANT_FIELDS))
+                )
+            ]
+
+        # назва товару для slug варіанта — вже з урахуванням змін цього прогону
+        product_names = dict(
+            Product.objects
+            .filter(pk__in={row['product_id'] for row, _ in pending})
+            .values_list('pk', 'name')
+        )
+        product_names.update(
+            (pk, name) for pk, name in self.new_names.items() if pk in product_names
+        )
+
+        for row, changes in pending:
+            if SLUG_SOURCE_FIELDS & changes.keys() or row['product_id'] in renamed_products:
+                merged = {**row, **changes}
+                slug = self.variant_slugs.allocate(variant_slug_base(
+                    product_names.get(row['product_id']),
+                    merged['weight'], merged['color'], merged['size'], merged['sku'],
+                    merged['barcode'], merged['torgsoft_id'],
+                ), row['pk'])
+                if slug != row['slug']:
+                    changes['slug'] = slug
+            if not changes:
+                continue
+            variant_diffs.append((row['pk'], changes))
+            if _is_update(changes):
+                result.updated += 1
+                result.product_ids.add(row['product_id'])
+                _preview(result, 'Variant', row, changes, self.preview_limit)
+
+        return product_diffs, variant_diffs
+
+
+def sync_catalog(ts_rows, products=True, variants=True, dry=False, full=False,
+                 preview_limit=400):
+    """
+    Порівнює Product / Product_Variant з рядками файлу (ключ — good_id) і
+    записує зміни. ts_rows — будь-який ітерабельний потік рядків
+    (parser.parse_rows). dry=True — лише рахує та формує preview.
+    """
+    sync = _CatalogSync(products, variants, dry, full, preview_limit)
+    if dry:
+        return sync.run(ts_rows)
+    with transaction.atomic():
+        return sync.run(ts_rows)
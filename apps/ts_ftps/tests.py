@@ -0,0 +1,96 @@
+import io
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+
+from .parser import HASH_KEY, SNIFF_SIZE, iter_batches, parse_rows, row_hash
+
+TS_SYNC = {"FILE": {"ENCODING": "utf-8", "DELIMITER": "auto"}}
+
+
+def trs(rows, header=("GoodID", "GoodName", "RetailPrice", "WarehouseQuantity"), delim=";"):
+    """Вміст TRS-файлу в пам'яті: заголовок + рядки."""
+    lines = [delim.join(header)] + [delim.join(str(v) for v in row) for row in rows]
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def sample_rows(n):
+    # кирилиця — багатобайтові символи, тож межа 4 КБ потрапляє всередину рядка/символу
+    return [(1000 + i, f"Корм для котів, курка {i}", f"{100 + i},50", i % 7) for i in range(n)]
+
+
+@override_settings(TS_SYNC=TS_SYNC)
+class ParseRowsTests(SimpleTestCase):
+    """Потоковий розбір TRS: bytes і file-like, sniff на межі 4 КБ."""
+
+    def test_bytes_and_file_object_give_same_rows(self):
+        raw = trs(sample_rows(200))
+        from_bytes = list(parse_rows(raw))
+        stream = io.BytesIO(raw)
+        from_file = list(parse_rows(stream))
+
+        self.assertEqual(from_bytes, from_file)
+        self.assertEqual(len(from_bytes), 200)
+        self.assertEqual(from_bytes[0]["good_name"], "Корм для котів, курка 0")
+        self.assertEqual(from_bytes[0]["retail_price"], Decimal("100.50"))
+        # файл закриває власник, не парсер
+        self.assertFalse(stream.closed)
+
+    def test_row_across_sniff_boundary_is_intact(self):
+        raw = trs(sample_rows(300))
+        text = raw.decode("utf-8")
+        self.assertGreater(len(text), SNIFF_SIZE * 2)
+        # межа зразка для sniff — посеред рядка
+        self.assertNotIn(text[SNIFF_SIZE - 1], "\r\n")
+        rows = list(parse_rows(raw))
+
+        self.assertEqual([r["good_id"] for r in rows], [str(1000 + i) for i in range(300)])
+        self.assertTrue(all(r["good_name"] == f"Корм для котів, курка {i}" for i, r in enumerate(rows)))
+
+    def test_delimiter_is_sniffed(self):
+        rows = [(1, "Корм", "10.5", 3), (2, "Пісок", "20", 0)]
+        for delim in (";", "\t", "|"):
+            parsed = list(parse_rows(trs(rows, delim=delim)))
+            self.assertEqual([(r["good_id"], r["good_name"]) for r in parsed],
+                             [("1", "Корм"), ("2", "Пісок")], delim)
+
+    def test_rows_without_good_id_are_skipped(self):
+        parsed = list(parse_rows(trs([(1, "Корм", "1", 1), ("", "Без id", "1", 1)])))
+        self.assertEqual([r["good_id"] for r in parsed], ["1"])
+
+
+@override_settings(TS_SYNC=TS_SYNC)
+class RowHashTests(SimpleTestCase):
+    """Хеш рядка не залежить від порядку колонок і змінюється разом з даними."""
+
+    def test_hash_ignores_key_order_and_hash_field(self):
+        data = {"good_id": "1", "good_name": "Корм", "retail_price": Decimal("10.50")}
+        reordered = dict(reversed(list(data.items())))
+        self.assertEqual(row_hash(data), row_hash(reordered))
+        self.assertEqual(row_hash(data), row_hash({**data, HASH_KEY: "stale"}))
+        self.assertNotEqual(row_hash(data), row_hash({**data, "retail_price": Decimal("10.51")}))
+
+    def test_hash_is_stable_across_column_order(self):
+        rows = [(1, "Корм", "10,50", 3)]
+        header = ("GoodID", "GoodName", "RetailPrice", "WarehouseQuantity")
+        swapped = [(3, "10,50", "Корм", 1)]
+        first = next(parse_rows(trs(rows, header)))
+        second = next(parse_rows(trs(swapped, tuple(reversed(header)))))
+        self.assertEqual(first[HASH_KEY], second[HASH_KEY])
+        self.assertEqual(first[HASH_KEY], row_hash(first))
+
+
+class IterBatchesTests(SimpleTestCase):
+    """Групування потоку рядків у пачки за good_id."""
+
+    def test_batches_are_grouped_by_size(self):
+        rows = [{"good_id": str(i)} for i in range(7)]
+        batches = list(iter_batches(iter(rows), 3))
+        self.assertEqual([list(b) for b in batches], [["0", "1", "2"], ["3", "4", "5"], ["6"]])
+
+    def test_duplicates_in_batch_keep_last_and_blank_ids_skipped(self):
+        rows = [{"good_id": "1", "n": 1}, {"good_id": " "}, {"good_id": "1", "n": 2}, {"good_id": "2"}]
+        batches = list(iter_batches(rows, 10))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0]["1"]["n"], 2)
+        self.assertEqual(list(batches[0]), ["1", "2"])
@@ -1,8 +1,22 @@
+from django.utils.functional import SimpleLazyObject
+
 from .forms import CustomUserCreationForm
 from .forms import LoginForm
 
 def auth_forms(request):
+    """
+    Форми для модалки входу/реєстрації в шапці. Створюються ліниво:
+    порожні поля модалки рендеряться з кешованого фрагмента
+    (zoosvit/users/modal.html), тож на звичайних сторінках форма
+    не конструюється взагалі. auth_login_form / auth_register_form —
+    ті самі об'єкти; якщо в'юха передала свою (зв'язану) форму,
+    модалка рендерить її без кешу.
+    """
+    login_form = SimpleLazyObject(LoginForm)
+    register_form = SimpleLazyObject(CustomUserCreationForm)
     return {
-        'register_form': CustomUserCreationForm(),
-        'login_form': LoginForm(),
+        'register_form': register_form,
+        'login_form': login_form,
+        'auth_register_form': register_form,
+        'auth_login_form': login_form,
     }
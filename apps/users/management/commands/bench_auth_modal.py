@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from apps.users.context_processors import auth_forms
+from apps.users.forms import CustomUserCreationForm, LoginForm
+
+
+class Command(BaseCommand):
+    help = 'Порівнює час рендеру модалки входу: форми щоразу vs ліниві форми + кеш фрагмента'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--iterations', type=int, default=500)
+
+    def handle(self, *args, **opts):
+        n = opts['iterations']
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = SessionBase()
+
+        def eager():
+            # як було: обидві форми створюються і рендеряться на кожному запиті
+            form_login = LoginForm()
+            form_register = CustomUserCreationForm()
+            return render_to_string('zoosvit/users/modal.html', {
+                'login_form': form_login,
+                'register_form': form_register,
+            }, request=request)
+
+        def lazy():
+            return render_to_string('zoosvit/users/modal.html', auth_forms(request), request=request)
+
+        lazy()  # прогріваємо кеш фрагментів
+        for label, fn in (('eager', eager), ('lazy+cache', lazy)):
+            started = time.perf_counter()
+            for _ in range(n):
+                fn()
+            per_render = (time.perf_counter() - started) * 1000 / n
+            self.stdout.write(f'{label:12} {per_render:.3f} ms/рендер ({n} ітерацій)')